@@ -0,0 +1,46 @@
+# compares commands.followers.sig_codec with the previous convertbits/bech32 path
+# usage (from the repository root): python -m benchmarks.sig_codec [count]
+from chia.util.bech32m import bech32_encode, convertbits, bech32_decode
+from commands.followers.sig_codec import encode_signature, decode_signature, decode_many
+import secrets
+import sys
+import timeit
+
+
+def reference_encode_signature(origin_chain: bytes, destination_chain: bytes, nonce: bytes, coin_id: bytes | None, sig: bytes) -> str:
+    res = bech32_encode("r", convertbits(origin_chain + destination_chain + nonce, 8, 5)) + "-"
+    if coin_id is not None:
+        res += bech32_encode("c", convertbits(coin_id, 8, 5))
+    return res + "-" + bech32_encode("s", convertbits(sig, 8, 5))
+
+
+def reference_decode_signature(enc_sig: str):
+    parts = enc_sig.split("-")
+    route_data = convertbits(bech32_decode(parts[0], (32 + 3 + 3) * 2)[1], 5, 8, False)
+    coin_id = convertbits(bech32_decode(parts[1])[1], 5, 8, False)
+    sig = convertbits(bech32_decode(parts[-1], 96 * 2)[1], 5, 8, False)
+    return route_data[:3], route_data[3:6], route_data[6:], coin_id, sig
+
+
+def main(count: int):
+    signatures = [
+        (b"eth", b"xch", secrets.token_bytes(32), secrets.token_bytes(32), secrets.token_bytes(96))
+        for _ in range(count)
+    ]
+    encoded = [encode_signature(*s) for s in signatures]
+    assert encoded == [reference_encode_signature(*s) for s in signatures]
+
+    results = [
+        ("encode (reference)", lambda: [reference_encode_signature(*s) for s in signatures]),
+        ("encode (sig_codec)", lambda: [encode_signature(*s) for s in signatures]),
+        ("decode (reference)", lambda: [reference_decode_signature(e) for e in encoded]),
+        ("decode (sig_codec)", lambda: [decode_signature(e) for e in encoded]),
+        ("decode_many (sig_codec)", lambda: decode_many(encoded)),
+    ]
+    for name, fn in results:
+        seconds = min(timeit.repeat(fn, number=1, repeat=5))
+        print(f"{name:<24} {seconds * 1000:8.2f} ms for {count} signatures ({seconds / count * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -16,3 +16,9 @@ def get_config_item(path: List[str]) -> any:
     for p in path:
         current = current[p]
     return current
+
+def get_config_item_or_default(path: List[str], default: any) -> any:
+    try:
+        return get_config_item(path)
+    except (KeyError, TypeError):
+        return default
@@ -0,0 +1,73 @@
+from chia.types.blockchain_format.program import Program
+from chia.types.coin_spend import CoinSpend
+from chia.types.condition_opcodes import ConditionOpcode
+from chia.consensus.default_constants import DEFAULT_CONSTANTS
+from chia_rs import run_chia_program
+from collections import OrderedDict
+from typing import List, Tuple
+
+
+class CreateCoin:
+    puzzle_hash: bytes
+    amount: int
+    memos: Program | None
+
+    def __init__(self, puzzle_hash: bytes, amount: int, memos: Program | None):
+        self.puzzle_hash = puzzle_hash
+        self.amount = amount
+        self.memos = memos
+
+
+# runs coin spends with the native chia_rs runner and returns their CREATE_COIN conditions
+# results are cached by (coin id, spent height), so re-processing a range after a reorg doesn't re-run puzzles
+class ConditionExtractor:
+    max_cost: int
+    max_cache_size: int
+    cache: OrderedDict
+
+    def __init__(self, max_cost: int = DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM, max_cache_size: int = 4096):
+        self.max_cost = max_cost
+        self.max_cache_size = max_cache_size
+        self.cache = OrderedDict()
+
+
+    # spent_height=None (e.g., for mempool spends) skips the cache
+    def create_coins(self, coin_spend: CoinSpend, spent_height: int | None = None) -> List[CreateCoin]:
+        key: Tuple[bytes, int] = (coin_spend.coin.name(), spent_height)
+        if spent_height is not None and key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        # raises ValueError if the spend fails or goes over max_cost
+        _, output = run_chia_program(
+            bytes(coin_spend.puzzle_reveal),
+            bytes(coin_spend.solution),
+            self.max_cost,
+            0
+        )
+
+        create_coins = []
+        node = output
+        while node.pair is not None:
+            condition, node = node.pair
+            opcode = condition.pair[0].atom if condition.pair is not None else None
+            if opcode != ConditionOpcode.CREATE_COIN:
+                continue
+
+            # (51 puzzle_hash amount . (memos . _))
+            args = condition.pair[1]
+            puzzle_hash, args = args.pair
+            amount, args = args.pair
+            memos = Program.to(args.pair[0]) if args.pair is not None else None
+            create_coins.append(CreateCoin(
+                puzzle_hash.atom,
+                int.from_bytes(amount.atom, "big", signed=True),
+                memos
+            ))
+
+        if spent_height is not None:
+            self.cache[key] = create_coins
+            if len(self.cache) > self.max_cache_size:
+                self.cache.popitem(last=False)
+
+        return create_coins
@@ -1,16 +1,24 @@
-from typing import Any, Callable
+from typing import Any, Callable, Dict, List, Tuple
 from commands.models import *
-from commands.config import get_config_item
+from commands.config import get_config_item, get_config_item_or_default
 from sqlalchemy import and_
-from eth_account.messages import encode_typed_data
-from commands.followers.sig import encode_signature
+from commands.followers.sig_codec import encode_signature
+from commands.followers.evm_rpc import AdaptiveBlockWindow, BatchingHTTPProvider, PooledRPCProvider
+from commands.followers.evm_headers import BlockHeaderTracker, L1OriginCache
+from commands.followers.evm_signer import PortalMessageSigner
+from commands.followers.height_watcher import HeightWatcher
+from commands.followers.notifications import NotificationBus, new_message_topic
 from web3 import AsyncWeb3
+from web3.exceptions import BlockNotFound, TransactionNotFound
 from web3.providers.async_rpc import AsyncHTTPProvider
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.websocket import WebsocketProviderV2
 import aiohttp
 import asyncio
 import logging
 import asyncio
 import json
+import time
 import sys
 
 async def custom_retry_middleware(make_request: Callable[[str, Any], Any], web3: AsyncWeb3) -> Callable[[str, Any], Any]:
@@ -19,12 +27,28 @@ async def custom_retry_middleware(make_request: Callable[[str, Any], Any], web3:
             try:
                 return await make_request(method, params)
             except aiohttp.ClientResponseError as e:
+                # let the adaptive get_logs window handle 'range too large'-style rejections
+                if method == 'eth_getLogs' and e.status in [400, 413]:
+                    raise e
                 logging.error(f"HTTP error when calling RPC: {e.status} {e.message}; retrying in 5s...")
                 await asyncio.sleep(5)
 
     return middleware
 
 
+class PendingMessage:
+    generation: int
+    event: any
+    block_number: int
+    confirmation_height: int
+
+    def __init__(self, generation: int, event, confirmation_height: int):
+        self.generation = generation
+        self.event = event
+        self.block_number = event['blockNumber']
+        self.confirmation_height = confirmation_height
+
+
 class EthereumFollower:
     chain: str
     chain_id: bytes
@@ -33,12 +57,34 @@ class EthereumFollower:
     private_key: str
     is_optimism: bool
     send_sig: any
+    # initial get_logs window; also used as the reorg safety margin
     max_query_block_limit: int = 500
+    query_window: AdaptiveBlockWindow
     last_safe_height: int = 0
     l1_block_contract_address: str
     l1_block_contract: any = None
+    message_event_buffer: Dict[int, any]
+    pending_messages: asyncio.Queue
+    listener_generation: int
+    listener_rewind: Tuple[int, int] | None
+    header_tracker: BlockHeaderTracker
+    l1_origin_cache: L1OriginCache
+    ws_url: str | None
+    ws_connected: bool
+    height_watcher: HeightWatcher
+    l1_height_watcher: HeightWatcher | None
+    watcher_web3: AsyncWeb3 | None
+    new_logs_event: asyncio.Event
+    rpc_urls: List[str]
+    rpc_provider: AsyncBaseProvider | None
+    signer: PortalMessageSigner | None
+    backfill_concurrency: int
+    backfill_min_blocks: int
+    backfill_done: asyncio.Event
+    notifications: NotificationBus
+    signer_poll_interval: int
     
-    def __init__(self, chain: str, is_optimism: bool, send_sig: any):
+    def __init__(self, chain: str, is_optimism: bool, send_sig: any, notifications: NotificationBus | None = None):
         self.chain = chain
         self.chain_id = chain.encode()
         self.sign_min_height = get_config_item([self.chain, 'sign_min_height'])
@@ -46,23 +92,70 @@ class EthereumFollower:
         self.private_key = get_config_item([self.chain, 'my_hot_private_key'])
         self.is_optimism = is_optimism
         self.syncing = True
+        self.message_event_buffer = {}
+        self.pending_messages = asyncio.Queue(maxsize=1024)
+        self.listener_generation = 0
+        self.listener_rewind = None
+        self.header_tracker = BlockHeaderTracker(chain)
+        self.l1_origin_cache = L1OriginCache()
+        self.rpc_urls = get_config_item_or_default([self.chain, 'rpc_urls'], None) or [get_config_item([self.chain, 'rpc_url'])]
+        # with several endpoints, the window converges to what all of them accept
+        self.query_window = AdaptiveBlockWindow.for_rpc_url(
+            ",".join(self.rpc_urls),
+            initial_size=self.max_query_block_limit
+        )
+        self.ws_url = get_config_item_or_default([self.chain, 'ws_url'], None)
+        self.ws_connected = False
+        self.new_logs_event = asyncio.Event()
+        self.rpc_provider = None
+        self.signer = None
+        self.backfill_concurrency = get_config_item_or_default([self.chain, 'backfill_concurrency'], 4)
+        self.backfill_min_blocks = get_config_item_or_default([self.chain, 'backfill_min_blocks'], 10 * self.max_query_block_limit)
+        self.backfill_done = asyncio.Event()
+        self.watcher_web3 = None
+        self.height_watcher = HeightWatcher(chain, self.fetchBlockNumber, 5)
+        self.l1_height_watcher = None
         if self.is_optimism:
           self.l1_block_contract_address = get_config_item([self.chain, 'l1_block_contract_address'])
+          self.l1_height_watcher = HeightWatcher(f"{chain} L1", self.fetchL1BlockNumber, 10)
         
         self.send_sig = send_sig
+        self.notifications = notifications if notifications is not None else NotificationBus()
+        # signers are woken up by notifications; polling only picks up anything missed (e.g., after a crash)
+        self.signer_poll_interval = get_config_item_or_default([self.chain, 'signer_poll_interval'], 120)
 
 
     def getDb(self):
        return setup_database()
     
 
+    def getRpcProvider(self) -> AsyncBaseProvider:
+        # shared by all tasks so calls made in the same tick can be batched together
+        if self.rpc_provider is None:
+            headers = {
+                'User-Agent': 'requests/1.0.0',
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            }
+            batching = get_config_item_or_default([self.chain, 'rpc_batching'], True)
+            providers = [
+                BatchingHTTPProvider(rpc_url, request_kwargs={ 'headers': headers }) if batching else AsyncHTTPProvider(rpc_url, request_kwargs={ 'headers': headers })
+                for rpc_url in self.rpc_urls
+            ]
+
+            if len(providers) == 1:
+                self.rpc_provider = providers[0]
+            else:
+                self.rpc_provider = PooledRPCProvider(
+                    providers,
+                    hedge=get_config_item_or_default([self.chain, 'rpc_hedging'], True)
+                )
+
+        return self.rpc_provider
+
+
     def getWeb3(self) -> AsyncWeb3:
-        headers = {
-            'User-Agent': 'requests/1.0.0',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        web3 = AsyncWeb3(AsyncHTTPProvider(get_config_item([self.chain, 'rpc_url']), request_kwargs={ 'headers': headers }))
+        web3 = AsyncWeb3(self.getRpcProvider())
         web3.middleware_onion.inject(custom_retry_middleware, name='custom_retry_middleware', layer=0)
 
         return web3
@@ -84,6 +177,7 @@ class EthereumFollower:
           destination=event['args']['destination'],
           contents=join_message_contents(event['args']['contents']),
           block_number=event['blockNumber'],
+          block_hash=bytes(event['blockHash']),
           sig=b'',
       )
 
@@ -97,188 +191,430 @@ class EthereumFollower:
               await asyncio.sleep(5)
 
 
+    def eventNonceToInt(self, event) -> int:
+      return int.from_bytes(event['args']['nonce'], 'big')
+
+
+    # returns all MessageSent events in [from_height, to_height] (inclusive), indexed by nonce
+    # one unfiltered call is much cheaper than one call per nonce when catching up
+    async def getMessageEventsInRange(self, contract, from_height: int, to_height: int) -> Dict[int, any]:
+      logs = await contract.events.MessageSent().get_logs(
+          fromBlock=from_height,
+          toBlock=to_height,
+      )
+
+      return {self.eventNonceToInt(log): log for log in logs}
+
+
+    async def fetchBlockNumber(self) -> int:
+      if self.watcher_web3 is None:
+          self.watcher_web3 = self.getWeb3()
+      return await self.getBlockNumber(self.watcher_web3)
+
+
+    # L1 block number as relayed by the L1Block contract (optimism chains only)
+    async def fetchL1BlockNumber(self) -> int:
+      if self.watcher_web3 is None:
+          self.watcher_web3 = self.getWeb3()
+      return await self.getL1BlockContract(self.watcher_web3).functions.number().call()
+
+
+    # the height messages need to be sign_min_height blocks behind - L1 block number for optimism chains
+    def getConfirmationWatcher(self) -> HeightWatcher:
+      return self.l1_height_watcher if self.is_optimism else self.height_watcher
+
+
     # warning: only use in the 'messageListener' thread
     async def getEventByIntNonce(self, web3, contract, nonce: int, start_height: int):
       if self.last_safe_height <= 0:
           self.last_safe_height = start_height
 
-      nonce_hex = "0x" + self.nonceIntToBytes(nonce)
+      # events for upcoming nonces are buffered when a range containing them is fetched
+      if nonce in self.message_event_buffer:
+          return self.message_event_buffer[nonce]
+
       query_start_height = max(self.last_safe_height, start_height) # cache
 
       while True:
-        current_block_height = await self.getBlockNumber(web3)
+        current_block_height = await self.height_watcher.get_peak()
 
         if query_start_height >= current_block_height:
             return None
 
-        query_end_height = min(query_start_height + self.max_query_block_limit - 1, current_block_height)
+        query_end_height = min(query_start_height + self.query_window.size - 1, current_block_height)
         
-        logging.info(f"Searching for {self.chain_id.decode()}-{nonce} from {query_start_height} to {query_end_height}...")
-        logs = await contract.events.MessageSent().get_logs(
-            fromBlock=query_start_height,
-            toBlock=query_end_height,
-            argument_filters={"nonce": nonce_hex},
+        logging.info(f"Fetching {self.chain_id.decode()} messages from {query_start_height} to {query_end_height} (looking for nonce {nonce})...")
+        query_start_time = time.monotonic()
+        try:
+            events = await self.getMessageEventsInRange(contract, query_start_height, query_end_height)
+        except Exception as e:
+            if not self.query_window.is_range_error(e) or self.query_window.size <= self.query_window.min_size:
+                raise e
+            self.query_window.record_error(e)
+            continue
+
+        self.query_window.record_response(
+            query_end_height - query_start_height + 1,
+            len(events),
+            time.monotonic() - query_start_time
         )
+        for event_nonce, event in events.items():
+            self.header_tracker.record(event['blockNumber'], event['blockHash'])
+            if event_nonce >= nonce:
+                self.message_event_buffer[event_nonce] = event
 
-        logs = [_ for _ in logs]
-        if len(logs) > 0:
-           return logs[0]
+        if nonce in self.message_event_buffer:
+           return self.message_event_buffer[nonce]
         
         # self.max_query_block_limit * 3 // 4 is much more than the expected reorg window
         self.last_safe_height = max(self.last_safe_height, query_end_height - self.max_query_block_limit * 3 // 4)
         query_start_height = query_end_height + 1
-    
 
-    async def messageListener(self):
-      db = self.getDb()
-      web3 = self.getWeb3()
 
+    def dropBufferedEvents(self, up_to_nonce: int | None = None):
+      if up_to_nonce is None:
+          self.message_event_buffer.clear()
+          return
+
+      for nonce in [n for n in self.message_event_buffer.keys() if n <= up_to_nonce]:
+          del self.message_event_buffer[nonce]
+
+
+    # forgets buffered events from a block that may have been reorged out (and everything after it)
+    #  so the next lookup re-queries the chain instead of returning the stale copy
+    def dropBufferedEventsFromHeight(self, height: int):
+      for nonce in [n for n, e in self.message_event_buffer.items() if e['blockNumber'] >= height]:
+          del self.message_event_buffer[nonce]
+      self.last_safe_height = min(self.last_safe_height, height - 1)
+    
+
+    def getPortalContract(self, web3: AsyncWeb3):
       portal_contract_abi = json.loads(open("artifacts/contracts/Portal.sol/Portal.json", "r").read())["abi"]
-      
+      return web3.eth.contract(address=self.portal_address, abi=portal_contract_abi)
+
+
+    def getL1BlockContract(self, web3: AsyncWeb3):
+      if self.l1_block_contract is None:
+        self.l1_block_contract = web3.eth.contract(
+          address=AsyncWeb3.to_checksum_address(self.l1_block_contract_address),
+          abi=open("l1_block_abi.json", "r").read()
+        )
+      return self.l1_block_contract
+
+
+    # returns (nonce, block number) of the latest message in the db
+    def getLatestSyncedMessage(self, db) -> Tuple[int, int]:
       latest_message_in_db = db.query(Message).filter(
          Message.source_chain == self.chain_id
       ).order_by(Message.nonce.desc()).first()
 
       latest_synced_nonce_int: int = int(latest_message_in_db.nonce.hex()[2:], 16) if latest_message_in_db is not None else 0
       last_synced_height: int = latest_message_in_db.block_number if latest_message_in_db is not None else get_config_item([self.chain, 'min_height'])
+
+      return latest_synced_nonce_int, last_synced_height
+
+
+    # returns the height that needs to be sign_min_height blocks deep before the event can be signed
+    # None means the height could not be determined yet
+    async def getEventConfirmationHeight(self, web3: AsyncWeb3, event) -> int | None:
+      event_block_number = event['blockNumber']
+      if not self.is_optimism:
+          # L1 - mainnet confirmations can be obtained from block number
+          return event_block_number
+
+      # L2 - https://jumpcrypto.com/writing/bridging-and-finality-op-and-arb/
+      # in short, since we're trusting the sequencer anyway, we can also trust:
+      # https://github.com/ethereum-optimism/optimism/blob/develop/packages/contracts-bedrock/src/L2/L1Block.sol/
+      # to relay L1 block numbers accurately
+      # self.sign_min_height is then the min. number of confirmations in L1 blocks
+      # you can find the address for the contract at https://docs.base.org/docs/base-contracts
+      event_l1_block_number = await self.getL1OriginOfBlock(web3, event_block_number, event['blockHash'])
+      if event_l1_block_number is not None:
+          logging.info(f"{self.chain_id.decode()} message listener: Message {self.chain_id.decode()}-{event['args']['nonce'].hex()} has L1 block number {event_l1_block_number} (L2: {event_block_number})")
+
+      return event_l1_block_number
+
+
+    # returns the L1 block number relayed by the L1Block deposit tx of the given L2 block
+    async def getL1OriginOfBlock(self, web3: AsyncWeb3, block_number: int, block_hash: bytes | None = None) -> int | None:
+      if block_hash is not None:
+          l1_block_number = self.l1_origin_cache.get(block_hash)
+          if l1_block_number is not None:
+              return l1_block_number
+
+      # fetch by hash when it's known - after a reorg, the block at block_number may be a different one,
+      #  and its L1 origin would end up cached under block_hash
+      block_id = block_hash if block_hash is not None else block_number
+      try:
+          # the L1 attributes deposit is always the first tx of an L2 block, so try to fetch only that one
+          relevant_tx = await web3.eth.get_transaction_by_block(block_id, 0)
+          if block_hash is None:
+              block_hash = relevant_tx.blockHash
+
+          if not relevant_tx.to or relevant_tx.to != self.l1_block_contract_address:
+              logging.info(f"{self.chain_id.decode()} message listener: first tx of block {block_number} is not the expected L1Block update; scanning full block")
+              block = await web3.eth.get_block(block_hash, full_transactions=True)
+              relevant_tx = None
+              for tx in block.transactions:
+                  if tx.to and tx.to == self.l1_block_contract_address:
+                      relevant_tx = tx
+                      break
+      except (TransactionNotFound, BlockNotFound):
+          logging.info(f"{self.chain_id.decode()} message listener: block {block_number} not found; it may have been reorged out")
+          return None
+
+      if relevant_tx is None:
+          return None
       
+      raw_input = bytes(relevant_tx.input)
+      # https://github.com/ethereum-optimism/optimism/blob/develop/packages/contracts-bedrock/src/L2/L1Block.sol/#L112
+      input_offset = 28
+      l1_block_number = int(raw_input[input_offset:input_offset + 8].hex(), 16)
+
+      self.l1_origin_cache.put(block_hash, l1_block_number)
+      return l1_block_number
+
+
+    def requestListenerRewind(self, latest_synced_nonce_int: int, last_synced_height: int):
+      # queued events from the current generation will be ignored by the confirmation stage
+      self.listener_generation += 1
+      self.listener_rewind = (latest_synced_nonce_int, last_synced_height - self.max_query_block_limit)
+
+
+    # highest block whose messages are already deep enough to be signed
+    async def getSafeBackfillHeight(self, web3: AsyncWeb3) -> int:
+      head = await self.height_watcher.get_peak()
+      if not self.is_optimism:
+          return head - self.sign_min_height
+
+      # sign_min_height is in L1 blocks; walk back from the L2 head until the L1 origin is deep enough
+      l1_tip = await self.l1_height_watcher.get_peak()
+      step = max(self.sign_min_height, 1) * 6 # L1 blocks are ~6 times longer than L2 blocks
+      candidate = head - step
+      while candidate > 0:
+          l1_origin = await self.getL1OriginOfBlock(web3, candidate)
+          if l1_origin is not None and l1_origin + self.sign_min_height <= l1_tip:
+              return candidate
+          candidate -= step
+          step *= 2
+
+      return 0
+
+
+    # fetches a shard; shards rejected by the provider are split in half and retried
+    async def scanBackfillShard(self, contract, semaphore: asyncio.Semaphore, from_height: int, to_height: int) -> Dict[int, any]:
+      block_count = to_height - from_height + 1
+      try:
+          async with semaphore:
+              query_start_time = time.monotonic()
+              events = await self.getMessageEventsInRange(contract, from_height, to_height)
+          self.query_window.record_response(block_count, len(events), time.monotonic() - query_start_time)
+          return events
+      except Exception as e:
+          if from_height >= to_height or not self.query_window.is_range_error(e):
+              raise e
+          # concurrent shards fail together; the window only needs to end up below half of the rejected range once
+          if self.query_window.size > block_count // 2:
+              self.query_window.record_error(e)
+
+      middle = (from_height + to_height) // 2
+      async with asyncio.TaskGroup() as task_group:
+          first_half = task_group.create_task(self.scanBackfillShard(contract, semaphore, from_height, middle))
+          second_half = task_group.create_task(self.scanBackfillShard(contract, semaphore, middle + 1, to_height))
+      return first_half.result() | second_half.result()
+
+
+    # scans everything between the last synced message and the confirmed tip in concurrent shards
+    # and bulk-inserts the results; returns the new (latest nonce, last synced height)
+    async def backfillMessages(self, db, web3: AsyncWeb3, contract, latest_synced_nonce_int: int, last_synced_height: int) -> Tuple[int, int]:
+      safe_height = await self.getSafeBackfillHeight(web3)
+      if safe_height - last_synced_height < self.backfill_min_blocks:
+          return latest_synced_nonce_int, last_synced_height
+
+      shard_size = self.query_window.size
+      shards = [
+          (h, min(h + shard_size - 1, safe_height))
+          for h in range(last_synced_height, safe_height + 1, shard_size)
+      ]
+      logging.info(f"{self.chain_id.decode()} backfill: scanning blocks {last_synced_height}-{safe_height} in {len(shards)} shards...")
+
+      semaphore = asyncio.Semaphore(self.backfill_concurrency)
+      # a failing shard cancels the others instead of leaving them running in the background
+      async with asyncio.TaskGroup() as task_group:
+          tasks = [
+              task_group.create_task(self.scanBackfillShard(contract, semaphore, from_height, to_height))
+              for from_height, to_height in shards
+          ]
+
+      events = {}
+      for task in tasks:
+          events.update(task.result())
+
+      nonces = sorted([n for n in events.keys() if n > latest_synced_nonce_int])
+      for i, nonce in enumerate(nonces):
+          if nonce != latest_synced_nonce_int + 1 + i:
+              logging.error(f"{self.chain_id.decode()} backfill: expected nonce {latest_synced_nonce_int + 1 + i}, got {nonce}; discarding backfill results")
+              return latest_synced_nonce_int, last_synced_height
+
+      if len(nonces) == 0:
+          logging.info(f"{self.chain_id.decode()} backfill: no new messages found up to block {safe_height}")
+          return latest_synced_nonce_int, last_synced_height
+
+      messages = [self.eventObjectToMessage(events[nonce]) for nonce in nonces]
+      db.add_all(messages)
+      db.commit()
+      self.notifyNewMessages(messages)
+      logging.info(f"{self.chain_id.decode()} backfill: added messages {latest_synced_nonce_int + 1}-{nonces[-1]} (up to block {safe_height})")
+
+      return nonces[-1], events[nonces[-1]]['blockNumber']
+
+
+    # discovery stage: finds message events in nonce order and hands them to messageConfirmer
+    async def messageListener(self):
+      db = self.getDb()
+      web3 = self.getWeb3()
+
+      latest_synced_nonce_int, last_synced_height = self.getLatestSyncedMessage(db)
       logging.info(f"Last synced nonce: {self.chain_id.decode()}-{latest_synced_nonce_int}")
 
-      contract = web3.eth.contract(address=self.portal_address, abi=portal_contract_abi)
+      contract = self.getPortalContract(web3)
+      try:
+          latest_synced_nonce_int, last_synced_height = await self.backfillMessages(db, web3, contract, latest_synced_nonce_int, last_synced_height)
+      except:
+          logging.error(f"{self.chain_id.decode()} backfill: failed; continuing with the regular listener", exc_info=True)
+      self.backfill_done.set()
+
+      synced = False
 
       while True:
         try:
+            if self.listener_rewind is not None:
+                latest_synced_nonce_int, last_synced_height = self.listener_rewind
+                self.listener_rewind = None
+                self.dropBufferedEvents()
+                self.last_safe_height -= 10 * self.max_query_block_limit
+                logging.info(f"{self.chain_id.decode()} message listener: rewinding to nonce {latest_synced_nonce_int + 1} (height {last_synced_height})")
+
+            generation = self.listener_generation
             next_message_event = await self.getEventByIntNonce(web3, contract, latest_synced_nonce_int + 1, last_synced_height - 1)
 
             if next_message_event is None:
-                logging.info(f"{self.chain_id.decode()} message listener: all on-chain messages synced; listening for new messages.")
-                
-                while next_message_event is None:
-                  await asyncio.sleep(30)
-                  next_message_event = await self.getEventByIntNonce(web3, contract, latest_synced_nonce_int + 1, last_synced_height - 1)
+                if not synced:
+                    logging.info(f"{self.chain_id.decode()} message listener: all on-chain messages synced; listening for new messages.")
+                    synced = True
 
+                # with a subscription, new logs wake us up; polling is only a fallback
+                await self.waitForEvent(self.new_logs_event, 300 if self.ws_connected else 30)
                 continue
 
-            event_block_number = next_message_event['blockNumber']
+            synced = False
+            confirmation_height = await self.getEventConfirmationHeight(web3, next_message_event)
+            if confirmation_height is None:
+                logging.error(f"{self.chain_id.decode()} message listener: could not find L1Block update tx for block {next_message_event['blockNumber']}; sleeping 30s and retrying...")
+                self.dropBufferedEventsFromHeight(next_message_event['blockNumber'])
+                await asyncio.sleep(30)
+                continue
 
-            if not self.is_optimism:
-                # L1 - mainnet confirmations can be obtained from block number
-                eth_block_number = await self.getBlockNumber(web3)
+            await self.pending_messages.put(PendingMessage(generation, next_message_event, confirmation_height))
 
-                while event_block_number + self.sign_min_height > eth_block_number:
-                    await asyncio.sleep(5)
-                    eth_block_number = await self.getBlockNumber(web3)
-                    logging.info(f"{self.chain_id.decode()} message listener: Waiting for block {event_block_number + self.sign_min_height} to confirm message; current block: {eth_block_number}")
-            else:
-                # L2 - https://jumpcrypto.com/writing/bridging-and-finality-op-and-arb/
-                # in short, since we're trusting the sequencer anyway, we can also trust:
-                # https://github.com/ethereum-optimism/optimism/blob/develop/packages/contracts-bedrock/src/L2/L1Block.sol/
-                # to relay L1 block numbers accurately
-                # self.sign_min_height is then the min. number of confirmations in L1 blocks
-                # you can find the address for the contract at https://docs.base.org/docs/base-contracts
-                block = await web3.eth.get_block(event_block_number, full_transactions=True)
-                relevant_tx = None
-                for tx in block.transactions:
-                    if tx.to and tx.to == self.l1_block_contract_address:
-                        relevant_tx = tx
-                        break
-                
-                if relevant_tx is None:
-                    logging.error(f"{self.chain_id.decode()} message listener: could not find L1Block update tx for block {event_block_number}; sleeping 30s and retrying...")
-                    await asyncio.sleep(30)
-                    continue
-                
-                
-                raw_input = bytes(relevant_tx.input)
-                # https://github.com/ethereum-optimism/optimism/blob/develop/packages/contracts-bedrock/src/L2/L1Block.sol/#L112
-                input_offset = 28
-                event_l1_block_number = int(raw_input[input_offset:input_offset + 8].hex(), 16)
-                logging.info(f"{self.chain_id.decode()} message listener: Confirming message with L1 block number {event_l1_block_number} (L2: {event_block_number}) for {self.chain_id.decode()}-{next_message_event['args']['nonce'].hex()}")
-                
-                if self.l1_block_contract is None:
-                  self.l1_block_contract = web3.eth.contract(
-                    address=AsyncWeb3.to_checksum_address(self.l1_block_contract_address),
-                    abi=open("l1_block_abi.json", "r").read()
-                  )
-
-                l1_block_number = await self.l1_block_contract.functions.number().call()
-                while event_l1_block_number + self.sign_min_height > l1_block_number:
-                    await asyncio.sleep(10)
-                    l1_block_number = await self.l1_block_contract.functions.number().call()
-                    logging.info(f"{self.chain_id.decode()} message listener: Current L1 block number is {l1_block_number}")
-
-            next_message_event_copy = await self.getEventByIntNonce(web3, contract, latest_synced_nonce_int + 1, last_synced_height - 1)
-            if next_message_event_copy is None:
-                logging.info(f"{self.chain_id.decode()} message listener: could not get message event again; assuming reorg and retrying...")
-                last_synced_height -= self.max_query_block_limit
-                self.last_safe_height -= 10 * self.max_query_block_limit
+            latest_synced_nonce_int += 1
+            last_synced_height = next_message_event['blockNumber']
+            self.dropBufferedEvents(latest_synced_nonce_int)
+        except asyncio.CancelledError:
+            raise
+        except:
+            logging.exception(f"{self.chain_id.decode()} message listener: Exception occurred", exc_info=True)
+            sys.exit(1)
+
+
+    # confirmation stage: checks all pending messages against a single tip height per tick
+    # and adds every message that is deep enough (and still on-chain) to the db at once
+    async def messageConfirmer(self):
+      db = self.getDb()
+      web3 = self.getWeb3()
+
+      # the backfill may add messages to the db before the regular listener starts
+      await self.backfill_done.wait()
+      latest_synced_nonce_int, last_synced_height = self.getLatestSyncedMessage(db)
+      pending: List[PendingMessage] = []
+
+      while True:
+        try:
+            if len(pending) == 0:
+                pending.append(await self.pending_messages.get())
+            while not self.pending_messages.empty():
+                pending.append(self.pending_messages.get_nowait())
+            pending = [p for p in pending if p.generation == self.listener_generation]
+            if len(pending) == 0:
                 continue
-            
-            next_message = self.eventObjectToMessage(next_message_event)
-            next_message_copy = self.eventObjectToMessage(next_message_event_copy)
 
-            if next_message.nonce != next_message_copy.nonce or next_message.source != next_message_copy.source or next_message.destination_chain != next_message_copy.destination_chain or next_message.destination != next_message_copy.destination or next_message.contents != next_message_copy.contents or next_message.block_number != next_message_copy.block_number: 
-                logging.info(f"{self.chain_id.decode()} message listener: message event mismatch; assuming reorg and retrying...")
-                last_synced_height -= self.max_query_block_limit
-                self.last_safe_height -= 10 * self.max_query_block_limit
+            tip_height = await self.getConfirmationWatcher().get_peak()
+
+            # nonces increase with block numbers, so confirmed messages form a prefix of pending
+            ready_count = 0
+            while ready_count < len(pending) and pending[ready_count].confirmation_height + self.sign_min_height <= tip_height:
+                ready_count += 1
+
+            if ready_count == 0:
+                logging.info(f"{self.chain_id.decode()} message listener: Waiting for block {pending[0].confirmation_height + self.sign_min_height} to confirm {len(pending)} message(s); current block: {tip_height}")
+                await self.getConfirmationWatcher().wait_for(pending[0].confirmation_height + self.sign_min_height, timeout=60)
                 continue
-            
-            logging.info(f"{self.chain_id.decode()} message listener: Adding message #{self.chain_id.decode()}-{next_message.nonce.hex()}")
-            db.add(next_message)
+
+            ready = pending[:ready_count]
+
+            # a single header check per block replaces re-fetching the events
+            # all heights are checked concurrently so the header requests can share one batch
+            header_cache = {}
+            heights = list(set([p.block_number for p in ready]))
+            header_hashes = await asyncio.gather(*[self.header_tracker.fetch_hash(web3, height) for height in heights])
+            for height, header_hash in zip(heights, header_hashes):
+                header_cache[height] = header_hash
+
+            reorg = False
+            added_messages = []
+            for pending_message in ready:
+                next_message = self.eventObjectToMessage(pending_message.event)
+                if self.eventNonceToInt(pending_message.event) != latest_synced_nonce_int + 1:
+                    logging.info(f"{self.chain_id.decode()} message listener: unexpected nonce {self.eventNonceToInt(pending_message.event)}; retrying...")
+                    reorg = True
+                    break
+
+                if not await self.header_tracker.is_canonical(web3, next_message.block_number, next_message.block_hash, header_cache):
+                    logging.info(f"{self.chain_id.decode()} message listener: block {next_message.block_number} of message {self.chain_id.decode()}-{next_message.nonce.hex()} is no longer canonical; assuming reorg and retrying...")
+                    reorg = True
+                    break
+
+                logging.info(f"{self.chain_id.decode()} message listener: Adding message #{self.chain_id.decode()}-{next_message.nonce.hex()}")
+                db.add(next_message)
+                added_messages.append(next_message)
+                latest_synced_nonce_int += 1
+                last_synced_height = pending_message.block_number
+
             db.commit()
+            self.notifyNewMessages(added_messages)
 
-            latest_synced_nonce_int += 1
-            last_synced_height = event_block_number
+            if reorg:
+                pending = []
+                self.requestListenerRewind(latest_synced_nonce_int, last_synced_height)
+            else:
+                pending = pending[ready_count:]
         except:
-            logging.exception(f"{self.chain_id.decode()} message listener: Exception occurred", exc_info=True)
+            logging.exception(f"{self.chain_id.decode()} message confirmer: Exception occurred", exc_info=True)
             sys.exit(1)
   
-    async def signMessage(self, db, web3: AsyncWeb3, message: Message):
-        domain = {
-            'name': 'warp.green Portal',
-            'version': '1',
-            'chainId': await web3.eth.chain_id,
-            'verifyingContract': self.portal_address,
-        }
-        types = {
-            'Message': [
-                {'name': 'nonce', 'type': 'bytes32'},
-                {'name': 'source_chain', 'type': 'bytes3'},
-                {'name': 'source', 'type': 'bytes32'},
-                {'name': 'destination', 'type': 'address'},
-                {'name': 'contents', 'type': 'bytes32[]'},
-            ]
-        }
-
-        destination = message.destination.hex()[-40:]
-        if len(destination) < 40:
-           destination = "0" * (40 - len(destination)) + destination
-        destination = AsyncWeb3.to_checksum_address("0x" + destination)
-        encoded_data = encode_typed_data(
-            domain,
-            types,
-            {
-                'nonce': '0x' + message.nonce.hex(),
-                'source_chain': '0x' + message.source_chain.hex(),
-                'source': '0x' + message.source.hex(),
-                'destination': destination,
-                'contents': ['0x' + content.hex() for content in split_message_contents(message.contents)],
-            }
-        )
-        signed_message = web3.eth.account.sign_message(encoded_data, private_key=self.private_key)
-
-        # uint8(v), bytes32(r), bytes32(s)
-        v = hex(signed_message.v)[2:]
-        if len(v) < 2:
-            v = "0" * (2 - len(v)) + v
-        r = hex(signed_message.r)[2:]
-        if len(r) < 64:
-            r = (64 - len(r)) * "0" + r
-        s = hex(signed_message.s)[2:]
-        if len(s) < 64:
-            s = (64 - len(s)) * "0" + s
-        sig = bytes.fromhex(v + r + s)
+    def notifyNewMessages(self, messages: List[Message]):
+      for destination_chain in set([bytes(message.destination_chain) for message in messages]):
+          self.notifications.publish(new_message_topic(destination_chain))
+
+
+    async def getSigner(self, web3: AsyncWeb3) -> PortalMessageSigner:
+        # chain id is only fetched once
+        if self.signer is None:
+            self.signer = await PortalMessageSigner.create(web3, self.private_key, self.portal_address)
+        return self.signer
 
+
+    def saveSignature(self, message: Message, sig: bytes):
         logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Raw signature: {sig.hex()}")
 
         message.sig = encode_signature(
@@ -288,15 +624,13 @@ class EthereumFollower:
             None,
             sig
         ).encode()
-        db.commit()
         logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Signature: {message.sig.decode()}")
 
-        self.send_sig(message.sig.decode())
-
 
     async def messageSigner(self):
       db = self.getDb()
       web3 = self.getWeb3()
+      wakeup = self.notifications.subscribe(new_message_topic(self.chain_id))
 
       while True:
           try:
@@ -306,20 +640,75 @@ class EthereumFollower:
                   Message.sig == b''
               )).all()
 
-              for message in messages:
-                  await self.signMessage(db, web3, message)
+              if len(messages) > 0:
+                  signer = await self.getSigner(web3)
+                  for message, sig in zip(messages, signer.sign_many(messages)):
+                      self.saveSignature(message, sig)
                   db.commit()
 
-              await asyncio.sleep(5)
+                  for message in messages:
+                      self.send_sig(message.sig.decode())
+
+              await self.notifications.wait(wakeup, self.signer_poll_interval)
           except:
               logging.exception(f"{self.chain_id.decode()} message signer: Exception occurred", exc_info=True)
               sys.exit(1)
 
 
+    async def waitForEvent(self, event: asyncio.Event, timeout: float):
+      try:
+          await asyncio.wait_for(event.wait(), timeout)
+      except asyncio.TimeoutError:
+          pass
+      event.clear()
+
+
+    # pushes new heads and portal logs from a websocket subscription
+    # discovery and confirmation fall back to HTTP polling while this is disconnected
+    async def subscriptionListener(self):
+      retry_delay = 5
+      while True:
+        try:
+            async with AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.ws_url)) as w3:
+                heads_subscription_id = await w3.eth.subscribe('newHeads')
+                logs_subscription_id = await w3.eth.subscribe('logs', {'address': self.portal_address})
+
+                logging.info(f"{self.chain_id.decode()} subscription listener: subscribed to new heads and portal logs")
+                self.ws_connected = True
+                retry_delay = 5
+
+                async for response in w3.ws.process_subscriptions():
+                    if response['subscription'] == heads_subscription_id:
+                        head = response['result']
+                        self.header_tracker.record(head['number'], head['hash'])
+                        await self.height_watcher.publish(head['number'])
+                    elif response['subscription'] == logs_subscription_id:
+                        log = response['result']
+                        # the log can arrive before its block's head; the listener only queries up to the peak
+                        if not log.get('removed', False):
+                            await self.height_watcher.publish(log['blockNumber'])
+                        self.new_logs_event.set()
+        except:
+            logging.warning(f"{self.chain_id.decode()} subscription listener: connection lost; falling back to polling and resubscribing in {retry_delay}s", exc_info=True)
+
+        self.ws_connected = False
+        # wake up the listener so it notices the fallback
+        self.new_logs_event.set()
+        await asyncio.sleep(retry_delay)
+        retry_delay = min(retry_delay * 2, 120)
+
+
     def run(self, loop):
       self.loop = loop
 
+      self.loop.create_task(self.height_watcher.run())
+      if self.l1_height_watcher is not None:
+        self.loop.create_task(self.l1_height_watcher.run())
+      if self.ws_url is not None:
+        self.loop.create_task(self.subscriptionListener())
+
       self.loop.create_task(self.messageListener())
+      self.loop.create_task(self.messageConfirmer())
       self.loop.create_task(self.messageSigner())
 
     async def wait_for_node(self, log_startup_connection_errors: bool):
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from web3 import AsyncWeb3
+from web3.exceptions import BlockNotFound
+import logging
+
+
+# keeps block number -> block hash for the most recent blocks a follower has seen
+# used to detect reorgs with a single header fetch instead of re-scanning logs
+class BlockHeaderTracker:
+    chain: str
+    max_size: int
+    hashes: OrderedDict
+
+    def __init__(self, chain: str, max_size: int = 4096):
+        self.chain = chain
+        self.max_size = max_size
+        self.hashes = OrderedDict()
+
+
+    # returns False if a different hash was previously recorded for this height (i.e., a reorg happened)
+    def record(self, number: int, block_hash: bytes) -> bool:
+        block_hash = bytes(block_hash)
+        previous_hash = self.hashes.get(number)
+        if previous_hash is not None and previous_hash != block_hash:
+            logging.info(f"{self.chain} header tracker: block {number} changed from 0x{previous_hash.hex()} to 0x{block_hash.hex()}")
+            # everything above a reorged block is also suspect
+            self.forget_from(number)
+
+        self.hashes[number] = block_hash
+        self.hashes.move_to_end(number)
+        while len(self.hashes) > self.max_size:
+            self.hashes.popitem(last=False)
+
+        return previous_hash is None or previous_hash == block_hash
+
+
+    def forget_from(self, number: int):
+        for height in [h for h in self.hashes.keys() if h >= number]:
+            del self.hashes[height]
+
+
+    async def fetch_hash(self, web3: AsyncWeb3, number: int) -> bytes | None:
+        try:
+            block = await web3.eth.get_block(number)
+        except BlockNotFound:
+            # the chain is shorter than it used to be (reorg to a shorter fork) or the node is lagging
+            return None
+
+        block_hash = bytes(block['hash'])
+        self.record(number, block_hash)
+        return block_hash
+
+
+    # checks that block_hash is still the canonical block at the given height
+    # header_cache can be shared between calls to fetch each height only once
+    async def is_canonical(self, web3: AsyncWeb3, number: int, block_hash: bytes, header_cache: dict | None = None) -> bool:
+        if header_cache is not None and number in header_cache:
+            current_hash = header_cache[number]
+        else:
+            current_hash = await self.fetch_hash(web3, number)
+            if header_cache is not None:
+                header_cache[number] = current_hash
+
+        return current_hash is not None and current_hash == bytes(block_hash)
+
+
+# bounded L2 block hash -> L1 origin block number cache for optimism-style chains
+# keyed by hash (not number) so reorged L2 blocks never return a stale origin
+class L1OriginCache:
+    max_size: int
+    origins: OrderedDict
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self.origins = OrderedDict()
+
+
+    def get(self, block_hash: bytes) -> int | None:
+        block_hash = bytes(block_hash)
+        origin = self.origins.get(block_hash)
+        if origin is not None:
+            self.origins.move_to_end(block_hash)
+        return origin
+
+
+    def put(self, block_hash: bytes, l1_block_number: int):
+        block_hash = bytes(block_hash)
+        self.origins[block_hash] = l1_block_number
+        self.origins.move_to_end(block_hash)
+        while len(self.origins) > self.max_size:
+            self.origins.popitem(last=False)
@@ -0,0 +1,388 @@
+from typing import Any, Dict, List, Set, Tuple
+from collections import deque
+from web3.providers.async_rpc import AsyncHTTPProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3._utils.request import async_make_post_request
+from web3.types import RPCEndpoint, RPCResponse
+import aiohttp
+import asyncio
+import logging
+import json
+import time
+import random
+
+# substrings found in 'block range too large' / 'too many results' errors returned by common providers
+RANGE_ERROR_HINTS = [
+    "block range",
+    "range too large",
+    "range is too large",
+    "range is too wide",
+    "query returned more than",
+    "response size exceeded",
+    "response size is larger",
+    "too many results",
+    "limited to a",
+    "query timeout",
+]
+
+# rate limiting says nothing about the requested range, and shrinking the window would only make it worse
+RATE_LIMIT_HINTS = [
+    "rate limit",
+    "too many requests",
+    "request limit",
+    "daily limit",
+    "request count",
+    "quota",
+    "capacity",
+]
+
+
+# true if the provider rejected an eth_getLogs call because of the requested range, not because of its own health
+def is_range_error(e: Exception) -> bool:
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status in [400, 413]
+
+    message = str(e).lower()
+    if any(hint in message for hint in RATE_LIMIT_HINTS):
+        return False
+    return any(hint in message for hint in RANGE_ERROR_HINTS)
+
+
+# controls the number of blocks requested in a single eth_getLogs call
+# the window grows after fast responses with few results and shrinks when the provider
+# rejects the range, times out, or returns an oversized result set
+# learned sizes are shared between all followers that use the same RPC url
+class AdaptiveBlockWindow:
+    size: int
+    min_size: int
+    max_size: int
+    fast_response_seconds: float
+    slow_response_seconds: float
+    max_results: int
+
+    _windows: Dict[str, 'AdaptiveBlockWindow'] = {}
+
+    def __init__(
+        self,
+        initial_size: int = 500,
+        min_size: int = 10,
+        max_size: int = 10000,
+        fast_response_seconds: float = 2,
+        slow_response_seconds: float = 8,
+        max_results: int = 2000,
+    ):
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.fast_response_seconds = fast_response_seconds
+        self.slow_response_seconds = slow_response_seconds
+        self.max_results = max_results
+
+
+    @classmethod
+    def for_rpc_url(cls, rpc_url: str, initial_size: int = 500) -> 'AdaptiveBlockWindow':
+        if rpc_url not in cls._windows:
+            cls._windows[rpc_url] = cls(initial_size=initial_size)
+        return cls._windows[rpc_url]
+
+
+    def grow(self):
+        self.size = min(self.max_size, self.size * 2)
+
+
+    def shrink(self):
+        self.size = max(self.min_size, self.size // 2)
+
+
+    def record_response(self, block_count: int, result_count: int, seconds: float):
+        if seconds >= self.slow_response_seconds or result_count >= self.max_results:
+            self.shrink()
+            logging.info(f"get_logs window: slow/large response ({block_count} blocks, {result_count} results, {seconds:.1f}s); shrinking to {self.size} blocks")
+        elif seconds <= self.fast_response_seconds and result_count < self.max_results // 4 and block_count >= self.size:
+            # only grow if the full window was used - short ranges near the chain tip say nothing about provider limits
+            self.grow()
+
+
+    def is_range_error(self, e: Exception) -> bool:
+        return is_range_error(e)
+
+
+    def record_error(self, e: Exception):
+        self.shrink()
+        logging.warning(f"get_logs window: provider rejected range ({e}); shrinking to {self.size} blocks")
+
+
+# sends all JSON-RPC calls issued during the same event loop tick as a single batch array
+# falls back to one request per call if the endpoint does not support batches
+class BatchingHTTPProvider(AsyncHTTPProvider):
+    max_batch_size: int
+    batching_supported: bool
+    pending_requests: List[Tuple[bytes, int, asyncio.Future]]
+    flush_scheduled: bool
+    flush_tasks: Set[asyncio.Task]
+
+    def __init__(self, endpoint_uri: str, request_kwargs: Any = None, max_batch_size: int = 50):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self.max_batch_size = max_batch_size
+        self.batching_supported = True
+        self.pending_requests = []
+        self.flush_scheduled = False
+        # the loop only keeps weak references to tasks
+        self.flush_tasks = set()
+
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if not self.batching_supported:
+            return await super().make_request(method, params)
+
+        request_data = self.encode_rpc_request(method, params)
+        request_id = json.loads(request_data)["id"]
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests.append((request_data, request_id, future))
+
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.startFlush)
+
+        return await future
+
+
+    def startFlush(self):
+        task = asyncio.ensure_future(self.flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+
+    async def flush(self):
+        self.flush_scheduled = False
+        requests, self.pending_requests = self.pending_requests, []
+
+        await asyncio.gather(*[
+            self.send_batch(requests[i:i + self.max_batch_size])
+            for i in range(0, len(requests), self.max_batch_size)
+        ])
+
+
+    async def post(self, request_data: bytes) -> Any:
+        raw_response = await async_make_post_request(
+            self.endpoint_uri, request_data, **self.get_request_kwargs()
+        )
+        return self.decode_rpc_response(raw_response)
+
+
+    def failRequests(self, requests: List[Tuple[bytes, int, asyncio.Future]], e: Exception):
+        for _, __, future in requests:
+            if not future.done():
+                future.set_exception(e)
+
+
+    # a batch of cheap calls tells 'batches not supported' apart from a batch rejected because of one of its calls
+    async def probeBatching(self) -> bool:
+        probe = [self.encode_rpc_request("eth_chainId", []) for _ in range(2)]
+        try:
+            responses = await self.post(b"[" + b",".join(probe) + b"]")
+        except aiohttp.ClientResponseError as e:
+            return e.status >= 500 or e.status == 429
+        except Exception:
+            return True
+
+        return isinstance(responses, list)
+
+
+    async def send_batch(self, requests: List[Tuple[bytes, int, asyncio.Future]]):
+        try:
+            if len(requests) == 1:
+                responses = [await self.post(requests[0][0])]
+            else:
+                responses = await self.post(b"[" + b",".join([r[0] for r in requests]) + b"]")
+        except aiohttp.ClientResponseError as e:
+            # some providers reject batch arrays with an HTTP error instead of a JSON-RPC one; 429 is just rate limiting
+            if len(requests) == 1 or e.status == 429:
+                self.failRequests(requests, e)
+                return
+
+            if e.status < 500 and not await self.probeBatching():
+                logging.warning(f"RPC {self.endpoint_uri}: batch request rejected (HTTP {e.status}); sending requests individually from now on")
+                self.batching_supported = False
+            else:
+                logging.warning(f"RPC {self.endpoint_uri}: batch request failed (HTTP {e.status}); retrying its calls individually")
+            await asyncio.gather(*[self.send_batch([r]) for r in requests])
+            return
+        except Exception as e:
+            self.failRequests(requests, e)
+            return
+
+        if not isinstance(responses, list):
+            # batch rejected as a whole (usually 'batch requests not supported')
+            if not await self.probeBatching():
+                logging.warning(f"RPC {self.endpoint_uri}: batch request rejected ({responses.get('error')}); sending requests individually from now on")
+                self.batching_supported = False
+            else:
+                logging.warning(f"RPC {self.endpoint_uri}: batch request rejected ({responses.get('error')}); retrying its calls individually")
+            await asyncio.gather(*[self.send_batch([r]) for r in requests])
+            return
+
+        responses_by_id = {response.get("id"): response for response in responses}
+        errors = 0
+        for _, request_id, future in requests:
+            if future.done():
+                continue
+
+            response = responses_by_id.get(request_id)
+            if response is None:
+                future.set_exception(ValueError(f"RPC {self.endpoint_uri}: no response for request {request_id} in batch"))
+                errors += 1
+                continue
+
+            # per-call errors are returned as-is; web3 raises them for the call that caused them
+            if "error" in response:
+                errors += 1
+            future.set_result(response)
+
+        if errors > 0:
+            logging.info(f"RPC {self.endpoint_uri}: {errors}/{len(requests)} calls in batch returned an error")
+
+
+# live latency/error statistics for a single RPC endpoint
+class EndpointScore:
+    provider: AsyncHTTPProvider
+    latency_ewma: float | None
+    error_rate: float
+    consecutive_errors: int
+    cooldown_until: float
+    recent_latencies: deque
+
+    def __init__(self, provider: AsyncHTTPProvider):
+        self.provider = provider
+        self.latency_ewma = None
+        self.error_rate = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0
+        self.recent_latencies = deque(maxlen=200)
+
+
+    def record_success(self, seconds: float):
+        self.latency_ewma = seconds if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * seconds
+        self.error_rate *= 0.9
+        self.consecutive_errors = 0
+        self.recent_latencies.append(seconds)
+
+
+    def record_error(self):
+        self.error_rate = 0.9 * self.error_rate + 0.1
+        self.consecutive_errors += 1
+        self.cooldown_until = time.monotonic() + min(300, 5 * 2 ** (self.consecutive_errors - 1))
+
+
+    # lower is better; endpoints without samples are tried first so they get measured
+    def score(self) -> float:
+        if self.latency_ewma is None:
+            return 0
+        return self.latency_ewma * (1 + 4 * self.error_rate)
+
+
+    def in_cooldown(self) -> bool:
+        return self.cooldown_until > time.monotonic()
+
+
+    def p95_latency(self, min_samples: int = 20) -> float | None:
+        if len(self.recent_latencies) < min_samples:
+            return None
+        latencies = sorted(self.recent_latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+
+# routes each request to the best-scoring endpoint, fails over to the next one on errors and,
+# if hedging is enabled, sends a duplicate to the second-best endpoint when the first one
+# takes longer than its p95 latency
+class PooledRPCProvider(AsyncJSONBaseProvider):
+    endpoints: List[EndpointScore]
+    hedge: bool
+    exploration_rate: float
+
+    # methods that must never be sent twice
+    NON_HEDGEABLE_METHODS = ["eth_sendRawTransaction", "eth_sendTransaction"]
+
+    def __init__(self, providers: List[AsyncHTTPProvider], hedge: bool = True):
+        super().__init__()
+        self.endpoints = [EndpointScore(provider) for provider in providers]
+        self.hedge = hedge
+        self.exploration_rate = 0.02
+
+
+    def rankedEndpoints(self) -> List[EndpointScore]:
+        ranked = sorted(self.endpoints, key=lambda e: (e.in_cooldown(), e.score()))
+        # occasionally send a request to the runner-up so its score doesn't go stale
+        if len(ranked) > 1 and not ranked[1].in_cooldown() and random.random() < self.exploration_rate:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        return ranked
+
+
+    # the requested range is the problem, not the endpoint - every other endpoint would reject it too
+    # and the adaptive get_logs window needs to see the error to shrink
+    def isRangeRejection(self, method: RPCEndpoint, e: Exception) -> bool:
+        return method == 'eth_getLogs' and is_range_error(e)
+
+
+    async def requestFromEndpoint(self, endpoint: EndpointScore, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start_time = time.monotonic()
+        try:
+            response = await endpoint.provider.make_request(method, params)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.isRangeRejection(method, e):
+                raise e
+            endpoint.record_error()
+            logging.warning(f"RPC {endpoint.provider.endpoint_uri}: {method} failed ({type(e).__name__}: {e}); error rate now {endpoint.error_rate:.2f}")
+            raise e
+
+        endpoint.record_success(time.monotonic() - start_time)
+        return response
+
+
+    async def hedgedRequest(self, primary: EndpointScore, secondary: EndpointScore | None, method: RPCEndpoint, params: Any) -> RPCResponse:
+        budget = primary.p95_latency()
+        if secondary is None or budget is None or not self.hedge or method in self.NON_HEDGEABLE_METHODS:
+            return await self.requestFromEndpoint(primary, method, params)
+
+        tasks = [asyncio.ensure_future(self.requestFromEndpoint(primary, method, params))]
+        done, _ = await asyncio.wait(tasks, timeout=budget)
+        if len(done) == 0:
+            logging.info(f"RPC {primary.provider.endpoint_uri}: {method} slower than {budget:.2f}s; hedging to {secondary.provider.endpoint_uri}")
+            tasks.append(asyncio.ensure_future(self.requestFromEndpoint(secondary, method, params)))
+
+        try:
+            # return the first successful response; only fail if every attempt failed
+            last_error = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as e:
+                    if self.isRangeRejection(method, e):
+                        raise e
+                    last_error = e
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        ranked = self.rankedEndpoints()
+        last_error = None
+        for i, endpoint in enumerate(ranked):
+            secondary = ranked[i + 1] if i + 1 < len(ranked) else None
+            try:
+                return await self.hedgedRequest(endpoint, secondary, method, params)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.isRangeRejection(method, e):
+                    raise e
+                last_error = e
+
+        raise last_error
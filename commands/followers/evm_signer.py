@@ -0,0 +1,74 @@
+from commands.models import Message, split_message_contents
+from eth_utils import keccak
+from eth_keys import keys
+from web3 import AsyncWeb3
+from typing import List
+
+# EIP-712 type hashes for the Portal contract's signed messages
+# must match the types used in contracts/Portal.sol
+DOMAIN_TYPE_HASH = keccak(text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)")
+MESSAGE_TYPE_HASH = keccak(text="Message(bytes32 nonce,bytes3 source_chain,bytes32 source,address destination,bytes32[] contents)")
+
+DOMAIN_NAME = "warp.green Portal"
+DOMAIN_VERSION = "1"
+
+
+def left_pad_32(b: bytes) -> bytes:
+    return b"\x00" * (32 - len(b)) + b
+
+
+def right_pad_32(b: bytes) -> bytes:
+    return b + b"\x00" * (32 - len(b))
+
+
+# signs Portal messages with a domain separator computed once per chain
+# struct hashes are computed directly over the packed fields instead of going through encode_typed_data
+class PortalMessageSigner:
+    private_key: keys.PrivateKey
+    chain_id: int
+    portal_address: str
+    domain_separator: bytes
+
+    def __init__(self, private_key: str, chain_id: int, portal_address: str):
+        self.private_key = keys.PrivateKey(bytes.fromhex(private_key.replace("0x", "")))
+        self.chain_id = chain_id
+        self.portal_address = portal_address
+        self.domain_separator = keccak(
+            DOMAIN_TYPE_HASH +
+            keccak(text=DOMAIN_NAME) +
+            keccak(text=DOMAIN_VERSION) +
+            self.chain_id.to_bytes(32, "big") +
+            left_pad_32(bytes.fromhex(portal_address.replace("0x", "")))
+        )
+
+
+    @classmethod
+    async def create(cls, web3: AsyncWeb3, private_key: str, portal_address: str) -> 'PortalMessageSigner':
+        return cls(private_key, await web3.eth.chain_id, portal_address)
+
+
+    def hash_message(self, message: Message) -> bytes:
+        # destination is an address - keep the last 20 bytes
+        destination = message.destination[-20:]
+        contents_hash = keccak(b"".join(split_message_contents(message.contents)))
+
+        struct_hash = keccak(
+            MESSAGE_TYPE_HASH +
+            message.nonce +
+            right_pad_32(message.source_chain) +
+            message.source +
+            left_pad_32(destination) +
+            contents_hash
+        )
+
+        return keccak(b"\x19\x01" + self.domain_separator + struct_hash)
+
+
+    # returns uint8(v), bytes32(r), bytes32(s)
+    def sign(self, message: Message) -> bytes:
+        signature = self.private_key.sign_msg_hash(self.hash_message(message))
+        return bytes([signature.v + 27]) + signature.r.to_bytes(32, "big") + signature.s.to_bytes(32, "big")
+
+
+    def sign_many(self, messages: List[Message]) -> List[bytes]:
+        return [self.sign(message) for message in messages]
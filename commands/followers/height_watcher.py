@@ -0,0 +1,79 @@
+from typing import Awaitable, Callable
+import asyncio
+import logging
+import time
+
+
+# polls (or receives pushed) chain heights once per chain and lets any number of tasks wait on them
+# e.g., await watcher.wait_for(height) instead of each task polling the node in its own loop
+class HeightWatcher:
+    name: str
+    fetch_height: Callable[[], Awaitable[int]]
+    poll_interval: float
+    peak: int
+    last_update_time: float
+    condition: asyncio.Condition
+
+    def __init__(self, name: str, fetch_height: Callable[[], Awaitable[int]], poll_interval: float):
+        self.name = name
+        self.fetch_height = fetch_height
+        self.poll_interval = poll_interval
+        self.peak = 0
+        self.last_update_time = 0
+        self.condition = None
+
+
+    def getCondition(self) -> asyncio.Condition:
+        # created lazily so it binds to the loop the followers run on
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+
+    async def publish(self, height: int):
+        self.last_update_time = time.monotonic()
+        if height <= self.peak:
+            return
+
+        self.peak = height
+        async with self.getCondition():
+            self.getCondition().notify_all()
+
+
+    # returns the current peak, waiting for the first one if needed
+    async def get_peak(self) -> int:
+        return await self.wait_for(1)
+
+
+    # waits until the peak is at least height; returns the peak (which may be lower if timeout is reached)
+    async def wait_for(self, height: int, timeout: float | None = None) -> int:
+        if self.peak >= height:
+            return self.peak
+
+        condition = self.getCondition()
+        try:
+            async with condition:
+                await asyncio.wait_for(condition.wait_for(lambda: self.peak >= height), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return self.peak
+
+
+    # waits for the next peak
+    async def wait_for_next(self, timeout: float | None = None) -> int:
+        return await self.wait_for(self.peak + 1, timeout)
+
+
+    async def run(self):
+        while True:
+            # pushed heights (e.g., websocket heads) make polling unnecessary
+            if time.monotonic() - self.last_update_time >= self.poll_interval:
+                try:
+                    await self.publish(await self.fetch_height())
+                except asyncio.CancelledError:
+                    raise
+                except:
+                    logging.error(f"{self.name} height watcher: could not get height; retrying in {self.poll_interval}s", exc_info=True)
+
+            await asyncio.sleep(self.poll_interval)
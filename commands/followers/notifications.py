@@ -0,0 +1,41 @@
+from typing import Dict, List
+import asyncio
+
+
+def new_message_topic(destination_chain: bytes) -> str:
+    return f"new_message:{destination_chain.decode()}"
+
+
+def portal_rotated_topic(chain_id: bytes) -> str:
+    return f"portal_rotated:{chain_id.decode()}"
+
+
+# in-process pub/sub used to wake up tasks as soon as there's something for them to do
+# each subscriber gets its own event; it stays set until the subscriber clears it,
+#  so notifications published while the subscriber is busy are not lost
+class NotificationBus:
+    subscribers: Dict[str, List[asyncio.Event]]
+
+    def __init__(self):
+        self.subscribers = {}
+
+
+    def subscribe(self, *topics: str) -> asyncio.Event:
+        event = asyncio.Event()
+        for topic in topics:
+            self.subscribers.setdefault(topic, []).append(event)
+        return event
+
+
+    def publish(self, topic: str):
+        for event in self.subscribers.get(topic, []):
+            event.set()
+
+
+    # waits until the event is set or timeout is reached, then clears it for the next round
+    async def wait(self, event: asyncio.Event, timeout: float):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
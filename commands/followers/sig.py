@@ -1,125 +1,504 @@
-from chia.util.bech32m import bech32_encode, convertbits, bech32_decode
-from typing import Tuple, List
-from commands.config import get_config_item
-from nostr_sdk import Keys, Client, NostrSigner, EventBuilder, Tag, Filter, SingleLetterTag, Alphabet
-from datetime import timedelta
+from typing import Dict, Tuple, List
+from collections import OrderedDict
+from commands.config import get_config_item, get_config_item_or_default
+from commands.models import setup_database, SignatureOutbox
+from nostr_sdk import Keys, Client, NostrSigner, EventBuilder, Event, Tag
 import logging
 import time
-import queue
-import threading
 import asyncio
+import os
 
-def encode_signature(
-    origin_chain: bytes,
-    destination_chain: bytes,
-    nonce: bytes,
-    coin_id: bytes | None,
-    sig: bytes
-) -> str:
-    res = ""
-    route_data = origin_chain + destination_chain + nonce
-    encoded = bech32_encode("r", convertbits(route_data, 8, 5))
-    res += encoded
-    res += "-"
+# upper bounds (seconds) of the publish-ack latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, float("inf")]
 
-    if coin_id is not None:
-        res += bech32_encode("c", convertbits(coin_id, 8, 5))
 
-    res += "-"
+# send statistics for a single nostr relay
+class RelayHealth:
+    url: str
+    successes: int
+    failures: int
+    consecutive_failures: int
+    last_error: str | None
+    last_success_time: float | None
+    success_rate: float
+    latency_histogram: List[int]
+    latency_ewma: float | None
 
-    res += bech32_encode("s", convertbits(sig, 8, 5))
+    def __init__(self, url: str):
+        self.url = url
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success_time = None
+        self.success_rate = 1
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS)
+        self.latency_ewma = None
 
-    return res
 
+    def record_success(self, seconds: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.last_success_time = time.time()
+        self.success_rate = 0.9 * self.success_rate + 0.1
+        self.latency_ewma = seconds if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * seconds
+        for i, bucket in enumerate(LATENCY_BUCKETS):
+            if seconds <= bucket:
+                self.latency_histogram[i] += 1
+                break
 
-def decode_signature(enc_sig: str) -> Tuple[
-    bytes,  # origin_chain
-    bytes,  # destination_chain
-    bytes,  # nonce
-    bytes | None,  # coin_id
-    bytes  # sig
-]:
-    parts = enc_sig.split("-")
-    route_data = convertbits(bech32_decode(parts[0], (32 + 3 + 3) * 2)[1], 5, 8, False)
-    origin_chain = route_data[:3]
-    destination_chain = route_data[3:6]
-    nonce = route_data[6:]
 
-    coin_id = convertbits(bech32_decode(parts[1])[1], 5, 8, False)
-    sig = convertbits(bech32_decode(parts[-1], 96 * 2)[1], 5, 8, False)
+    def record_failure(self, error: str | None):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.success_rate = 0.9 * self.success_rate
 
-    return origin_chain, destination_chain, nonce, coin_id, sig
+
+    def is_healthy(self) -> bool:
+        return self.consecutive_failures < 5
+
+
+    # upper bound of the histogram bucket containing the given percentile; None without samples
+    def latency_percentile(self, percentile: float) -> float | None:
+        total = sum(self.latency_histogram)
+        if total == 0:
+            return None
+
+        seen = 0
+        for bucket, count in zip(LATENCY_BUCKETS, self.latency_histogram):
+            seen += count
+            if seen >= total * percentile:
+                return bucket
+        return LATENCY_BUCKETS[-1]
+
+
+    # lower is better; unmeasured relays are tried early so they get measured, unhealthy ones go last
+    def score(self) -> Tuple[bool, float, float]:
+        p90 = self.latency_percentile(0.9)
+        if p90 is None:
+            return not self.is_healthy(), 0, 0
+        # the histogram is coarse; recent latency breaks ties within a bucket
+        return not self.is_healthy(), min(p90, 30) * (1 + 4 * (1 - self.success_rate)), self.latency_ewma
+
+
+    def summary(self) -> str:
+        p50 = self.latency_percentile(0.5)
+        p90 = self.latency_percentile(0.9)
+        latency = f"p50 <= {p50}s, p90 <= {p90}s" if p50 is not None else "no samples"
+        return f"{self.url}: {self.successes} ok, {self.failures} failed, success rate {self.success_rate:.2f}, {latency}" + \
+            ("" if self.is_healthy() else " (demoted)")
+
+
+# the part of an encoded signature that identifies the message it signs
+def signature_route(sig: str) -> str:
+    return sig.split("-")[0]
+
+
+# a signature waiting to be published to the relays that haven't received it yet
+class OutboxItem:
+    sig: str
+    relays: List[str]
+    attempts: int
+    enqueued_time: float
+    # True for the background delivery to relays outside the quorum
+    fill_in: bool
+    delivered_any: bool
+
+    def __init__(self, sig: str, relays: List[str], fill_in: bool = False):
+        self.sig = sig
+        self.relays = relays
+        self.attempts = 0
+        self.enqueued_time = time.monotonic()
+        self.fill_in = fill_in
+        self.delivered_any = False
+
+
+# append-only local log of every signature, one per line
+# a newer signature for the same route (e.g., after a portal rotation) supersedes older ones,
+#  which are dropped when the log is compacted on startup
+class SignatureLog:
+    path: str
+    file: any
+
+    def __init__(self, path: str):
+        self.path = path
+        self.compact()
+        self.file = open(self.path, "a")
+
+
+    def compact(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as f:
+            lines = [line.strip() for line in f if line.strip() != ""]
+
+        latest_by_route = {}
+        for line in lines:
+            route = signature_route(line)
+            latest_by_route.pop(route, None) # re-insert so order follows the latest occurrence
+            latest_by_route[route] = line
+        if len(latest_by_route) == len(lines):
+            return
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join([line + "\n" for line in latest_by_route.values()]))
+        os.replace(tmp_path, self.path)
+        logging.info(f"Signature log: compacted {len(lines)} entries to {len(latest_by_route)}")
+
+
+    def append(self, sig: str):
+        self.file.write(sig + "\n")
+        self.file.flush()
 
 
 class MessageBroadcaster:
     relays: List[str]
     my_private_key: Keys
-    message_queue: queue.Queue
+    message_queue: asyncio.Queue
+    # deliveries to relays outside the quorum; served by their own workers, so they never hold up a quorum publish
+    fill_in_queue: asyncio.Queue
+    client: Client | None
+    client_lock: asyncio.Lock | None
+    relay_health: Dict[str, RelayHealth]
+    events: OrderedDict
+    max_cached_events: int
+    max_concurrent_sends: int
+    max_concurrent_fill_ins: int
+    publish_quorum: int
+    relay_timeout: float
+    max_attempts: int
+    retry_base_delay: float
+    # back-pressure metrics
+    sent_count: int
+    failed_count: int
+    retry_count: int
+    in_flight: int
+    retries_scheduled: int
+    max_queue_depth: int
+    max_queue_latency: float
+    db: any
+    log: SignatureLog | None
 
     def __init__(self):
         self.relays = get_config_item(["nostr", "relays"])
         self.my_private_key = Keys.from_mnemonic(get_config_item(["nostr", "my_mnemonic"]), None)
-        self.message_queue = queue.Queue()
+        self.message_queue = asyncio.Queue()
+        self.fill_in_queue = asyncio.Queue()
+        self.client = None
+        self.client_lock = None
+        self.relay_health = {relay: RelayHealth(relay) for relay in self.relays}
+        self.events = OrderedDict()
+        self.max_cached_events = 4096
+        self.max_concurrent_sends = 16
+        self.max_concurrent_fill_ins = 4
+        # signatures go to the fastest publish_quorum relays first; the others are filled in in the background
+        self.publish_quorum = int(get_config_item_or_default(["nostr", "publish_quorum"], 2))
+        self.relay_timeout = 15
+        self.max_attempts = 4
+        self.retry_base_delay = 3
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+        self.in_flight = 0
+        self.retries_scheduled = 0
+        self.max_queue_depth = 0
+        self.max_queue_latency = 0
+        self.db = None
+        self.log = None
+
+
+    # one long-lived client for all signatures; the relay pool reconnects dropped relays by itself
+    async def getClient(self) -> Client:
+        if self.client_lock is None:
+            self.client_lock = asyncio.Lock()
+
+        async with self.client_lock:
+            if self.client is None:
+                client = Client(NostrSigner.keys(self.my_private_key))
+                await client.add_relays(self.relays)
+                await client.connect()
+                self.client = client
+                logging.info(f"Nostr: connected to {len(self.relays)} relays")
+
+        return self.client
+
+
+    # drops the client if no relay is accepting events, so the next send starts from fresh connections
+    async def resetClientIfUnhealthy(self):
+        if self.client_lock is None or any(health.is_healthy() for health in self.relay_health.values()):
+            return
 
+        async with self.client_lock:
+            if self.client is None:
+                return
+            client, self.client = self.client, None
+            for health in self.relay_health.values():
+                health.consecutive_failures = 0
 
-    async def send_signature(
-        self,
-        sig: str,
-        retries: int = 0
-    ):  
-        # keep log locally
+        logging.warning("Nostr: all relays are failing; reconnecting")
         try:
-            open("messages.txt", "a").write(sig + "\n")
+            await client.disconnect()
         except:
-            open("messages.txt", "w").write(sig + "\n")
+            pass
+
+
+    def rankRelays(self, relays: List[str]) -> List[str]:
+        return sorted(relays, key=lambda relay: self.relay_health.setdefault(relay, RelayHealth(relay)).score())
+
+
+    # publishes an already signed event to one relay, recording its ack latency
+    async def sendToRelay(self, client: Client, event: Event, relay: str) -> bool:
+        health = self.relay_health.setdefault(relay, RelayHealth(relay))
 
+        start_time = time.monotonic()
         try:
-            [route_data, coin_data, sig_data] = sig.split("-")
-
-            signer = NostrSigner.keys(self.my_private_key)
-            client = Client(signer)
-            
-            await client.add_relays(self.relays)
-            await client.connect()
-
-            filter = Filter().custom_tag(
-                SingleLetterTag.lowercase(Alphabet.R), [route_data]
-            ).custom_tag(
-                SingleLetterTag.lowercase(Alphabet.C), [coin_data]
-            )
-            
-            text_note_builder = EventBuilder.text_note(sig_data, [
-                Tag.parse(["r", route_data]),
-                Tag.parse(["c", coin_data])
-            ])
+            # nostr-sdk 0.32 only returns the event id; a relay that rejects the event raises instead
+            await asyncio.wait_for(client.send_event_to([relay], event), self.relay_timeout)
+            error = None
+        except asyncio.TimeoutError:
+            error = f"no ack after {self.relay_timeout}s"
+        except Exception as e:
+            error = str(e)
 
-            await client.send_event_builder(text_note_builder)
-            logging.info(f"Nostr: sent event to relays.")
+        if error is None:
+            health.record_success(time.monotonic() - start_time)
+            return True
 
-            await client.disconnect()
+        health.record_failure(error)
+        if health.consecutive_failures == 5:
+            logging.warning(f"Nostr: relay {relay} failed {health.consecutive_failures} times in a row; demoting it. Last error: {error}")
+        return False
+
+
+    # each signature is signed into an event once, so every relay, retry and fill-in gets the same
+    #  event and a relay that already has it can de-duplicate it
+    def getEvent(self, sig: str) -> Event:
+        event = self.events.get(sig)
+        if event is not None:
+            self.events.move_to_end(sig)
+            return event
+
+        [route_data, coin_data, sig_data] = sig.split("-")
+        event = EventBuilder.text_note(sig_data, [
+            Tag.parse(["r", route_data]),
+            Tag.parse(["c", coin_data])
+        ]).to_event(self.my_private_key)
+
+        self.events[sig] = event
+        if len(self.events) > self.max_cached_events:
+            self.events.popitem(last=False)
+        return event
+
+
+    # single publish attempt; returns the relays that accepted the event
+    async def send_signature(self, sig: str, relays: List[str]) -> List[str]:
+        try:
+            client = await self.getClient()
+            event = self.getEvent(sig)
+
+            results = await asyncio.gather(*[self.sendToRelay(client, event, relay) for relay in relays])
+            delivered_relays = [relay for relay, ok in zip(relays, results) if ok]
+            if len(delivered_relays) == 0:
+                raise Exception("no relay accepted the event")
+            logging.info(f"Nostr: sent event to {len(delivered_relays)}/{len(relays)} relays.")
+            return delivered_relays
         except:
-            if retries < 3:
-                retries += 1
-                logging.error("Nostr: failed to send signature to relays; retrying in 3s...", exc_info=True)
-                time.sleep(3)
-                await self.send_signature(sig, retries)
+            logging.error("Nostr: failed to send signature to relays", exc_info=True)
+            await self.resetClientIfUnhealthy()
+            return []
+
+
+    def recordDelivery(self, item: OutboxItem, delivered_relays: List[str]):
+        rows = self.db.query(SignatureOutbox).filter(
+            SignatureOutbox.sig == item.sig.encode()
+        ).all()
+        for row in rows:
+            relay = row.relay.decode()
+            if relay in item.relays:
+                row.attempts += 1
+            if relay in delivered_relays:
+                row.delivered = True
+
+        if all(row.delivered for row in rows):
+            self.db.query(SignatureOutbox).filter(
+                SignatureOutbox.sig == item.sig.encode()
+            ).delete()
+        self.db.commit()
+
+
+    # drops the outbox rows of the given relays if the signature reached at least one relay; only
+    #  signatures that never left this node are kept around for the next startup
+    def forgetIfDelivered(self, sig: str, relays: List[str]):
+        rows = self.db.query(SignatureOutbox).filter(
+            SignatureOutbox.sig == sig.encode()
+        ).all()
+        if not any(row.delivered for row in rows):
+            return
+
+        remaining = [row for row in rows if row.relay.decode() not in relays]
+        for row in rows:
+            if row.relay.decode() in relays or all(r.delivered for r in remaining):
+                self.db.delete(row)
+        self.db.commit()
+
+
+    # re-queues signatures that had not reached every relay when the process stopped
+    def resumeOutbox(self):
+        rows_by_sig: Dict[bytes, List[SignatureOutbox]] = {}
+        for row in self.db.query(SignatureOutbox).all():
+            rows_by_sig.setdefault(row.sig, []).append(row)
+
+        resumed = 0
+        dropped = 0
+        for sig, rows in rows_by_sig.items():
+            pending = [row for row in rows if not row.delivered and row.relay.decode() in self.relays]
+            # a signature that never reached any relay gets one more round of attempts after the restart
+            never_delivered = not any(row.delivered for row in rows)
+            max_attempts = 2 * self.max_attempts if never_delivered else self.max_attempts
+            relays = [row.relay.decode() for row in pending if row.attempts < max_attempts]
+            if len(relays) == 0:
+                self.db.query(SignatureOutbox).filter(
+                    SignatureOutbox.sig == sig
+                ).delete()
+                dropped += 1
+                continue
+
+            self.message_queue.put_nowait(OutboxItem(sig.decode(), relays))
+            resumed += 1
+
+        self.db.commit()
+        if dropped > 0:
+            logging.info(f"Nostr outbox: gave up on {dropped} signature(s) that ran out of attempts")
+        if resumed > 0:
+            logging.info(f"Nostr outbox: resuming {resumed} signature(s) not yet delivered to every relay")
+
+
+    # a queued signature whose outbox rows are gone was replaced by a newer one for the same route
+    def isSuperseded(self, sig: str) -> bool:
+        return self.db.query(SignatureOutbox).filter(
+            SignatureOutbox.sig == sig.encode()
+        ).first() is None
+
+
+    def queueFor(self, item: OutboxItem) -> asyncio.Queue:
+        return self.fill_in_queue if item.fill_in else self.message_queue
+
+
+    def requeue(self, item: OutboxItem):
+        self.retries_scheduled -= 1
+        self.queueFor(item).put_nowait(item)
+
+
+    # several workers publish at the same time; the client multiplexes all events over the same relay connections
+    async def sender(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if not item.fill_in:
+                self.max_queue_latency = max(self.max_queue_latency, time.monotonic() - item.enqueued_time)
+
+            if self.isSuperseded(item.sig):
+                logging.info(f"Nostr outbox: dropping superseded signature {item.sig}")
+                queue.task_done()
+                continue
+
+            # first attempt: only wait for the fastest quorum; the remaining relays are filled in once it's done
+            fill_in_relays = []
+            if item.attempts == 0 and not item.fill_in and len(item.relays) > self.publish_quorum:
+                ranked = self.rankRelays(item.relays)
+                item.relays = ranked[:self.publish_quorum]
+                fill_in_relays = ranked[self.publish_quorum:]
+
+            self.in_flight += 1
+            try:
+                item.attempts += 1
+                delivered_relays = await self.send_signature(item.sig, item.relays)
+                self.recordDelivery(item, delivered_relays)
+            except:
+                logging.error(f"Nostr outbox: error when recording delivery of {item.sig}", exc_info=True)
+                self.db.rollback()
+                delivered_relays = []
+            finally:
+                self.in_flight -= 1
+                if len(fill_in_relays) > 0:
+                    self.fill_in_queue.put_nowait(OutboxItem(item.sig, fill_in_relays, fill_in=True))
+                queue.task_done()
+
+            first_delivery = len(delivered_relays) > 0 and not item.delivered_any
+            item.delivered_any = item.delivered_any or len(delivered_relays) > 0
+            # a signature counts as sent as soon as one relay of its quorum has it
+            if first_delivery and not item.fill_in:
+                self.sent_count += 1
+
+            if len(delivered_relays) == len(item.relays):
+                continue
+
+            # relays that didn't get the signature are retried on their own
+            item.relays = [relay for relay in item.relays if relay not in delivered_relays]
+            if item.attempts < self.max_attempts:
+                # retried later by the loop, so the worker (and every other task) keeps going meanwhile
+                delay = self.retry_base_delay * 2 ** (item.attempts - 1)
+                logging.info(f"Nostr: retrying signature in {delay}s (attempt {item.attempts + 1}/{self.max_attempts})")
+                self.retry_count += 1
+                self.retries_scheduled += 1
+                asyncio.get_running_loop().call_later(delay, self.requeue, item)
             else:
-                logging.error(f"Nostr: failed to send signature to relays: {sig}", exc_info=True)
+                if not item.delivered_any and not item.fill_in:
+                    self.failed_count += 1
+                logging.error(f"Nostr: gave up sending signature to {', '.join(item.relays)}: {item.sig}")
+                self.forgetIfDelivered(item.sig, item.relays)
 
-    async def sender(self):
+
+    async def metricsReporter(self):
+        last_report = None
         while True:
-            if not self.message_queue.empty():
-                for _ in range(min(64, self.message_queue.qsize())):
-                    sig = self.message_queue.get()
-                    await self.send_signature(sig)
+            await asyncio.sleep(60)
 
-            await asyncio.sleep(1)
+            report = (self.sent_count, self.failed_count, self.retry_count, self.message_queue.qsize(), self.fill_in_queue.qsize(), self.in_flight, self.retries_scheduled)
+            if report == last_report:
+                continue
+            last_report = report
+
+            logging.info(
+                f"Nostr outbox: {self.sent_count} sent, {self.failed_count} failed, {self.retry_count} retries; "
+                f"queued: {self.message_queue.qsize()} (max {self.max_queue_depth}), fill-ins queued: {self.fill_in_queue.qsize()}, in flight: {self.in_flight}, "
+                f"waiting to retry: {self.retries_scheduled}, max queue latency: {self.max_queue_latency:.1f}s"
+            )
+            for health in self.relay_health.values():
+                logging.info(f"Nostr relay {health.summary()}")
+            self.max_queue_depth = self.message_queue.qsize()
+            self.max_queue_latency = 0
 
 
     def add_signature(self, sig: str):
-        self.message_queue.put(sig)
+        self.log.append(sig)
+
+        # like in the log, a newer signature for the same route (e.g., after a portal rotation) supersedes
+        #  the ones still waiting in the outbox; a re-broadcast of the same signature starts over
+        route = signature_route(sig)
+        self.db.query(SignatureOutbox).filter(
+            SignatureOutbox.route == route.encode()
+        ).delete()
+        self.db.add_all([
+            SignatureOutbox(sig=sig.encode(), relay=relay.encode(), delivered=False, attempts=0, route=route.encode())
+            for relay in self.relays
+        ])
+        self.db.commit()
+
+        self.message_queue.put_nowait(OutboxItem(sig, list(self.relays)))
+        self.max_queue_depth = max(self.max_queue_depth, self.message_queue.qsize())
 
 
     def run(self, loop):
         self.loop = loop
-        self.loop.create_task(self.sender())
+        self.db = setup_database()
+        self.log = SignatureLog("messages.txt")
+        self.resumeOutbox()
+
+        for _ in range(self.max_concurrent_sends):
+            self.loop.create_task(self.sender(self.message_queue))
+        for _ in range(self.max_concurrent_fill_ins):
+            self.loop.create_task(self.sender(self.fill_in_queue))
+        self.loop.create_task(self.metricsReporter())
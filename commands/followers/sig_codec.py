@@ -0,0 +1,153 @@
+from typing import Dict, List, Tuple
+
+# signature codec used for nostr messages
+# wire format: bech32m("r", origin_chain + destination_chain + nonce) + "-" +
+#  bech32m("c", coin_id) (empty if there's no coin id) + "-" + bech32m("s", sig)
+# produces exactly the same strings as chia.util.bech32m's bech32_encode(hrp, convertbits(data, 8, 5))
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32M_CONST = 0x2BC830A3
+GENERATOR = [0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3]
+
+# xor of the generator values selected by the 5 bits shifted out of the checksum in one step
+def _build_polymod_table() -> List[int]:
+    table = [0] * 32
+    for top in range(32):
+        for i in range(5):
+            if (top >> i) & 1:
+                table[top] ^= GENERATOR[i]
+    return table
+
+
+# same for two steps at once (the checksum update is linear, so the 10 shifted-out bits can be looked up together)
+def _build_polymod_table_2() -> List[int]:
+    table = [0] * 1024
+    for top in range(1024):
+        chk = top << 20
+        for _ in range(2):
+            chk = ((chk & 0x1FFFFFF) << 5) ^ POLYMOD_TABLE[chk >> 25]
+        table[top] = chk
+    return table
+
+
+POLYMOD_TABLE = _build_polymod_table()
+POLYMOD_TABLE_2 = _build_polymod_table_2()
+
+# bech32 characters -> digits python's int() understands in base 32
+TO_BASE32 = str.maketrans(CHARSET, "0123456789abcdefghijklmnopqrstuv")
+CHARSET_VALUES = {c: i for i, c in enumerate(CHARSET)}
+
+ROUTE_MAX_LENGTH = (32 + 3 + 3) * 2
+SIG_MAX_LENGTH = 96 * 2
+DEFAULT_MAX_LENGTH = 90
+
+_hrp_states: Dict[str, int] = {}
+
+
+def _polymod(chk: int, values: List[int]) -> int:
+    i = 0
+    if len(values) & 1:
+        chk = ((chk & 0x1FFFFFF) << 5) ^ values[0] ^ POLYMOD_TABLE[chk >> 25]
+        i = 1
+    for i in range(i, len(values), 2):
+        chk = ((chk & 0xFFFFF) << 10) ^ (values[i] << 5) ^ values[i + 1] ^ POLYMOD_TABLE_2[chk >> 20]
+    return chk
+
+
+# checksum state after the expanded human-readable part; the same few hrps are used over and over
+def _hrp_state(hrp: str) -> int:
+    state = _hrp_states.get(hrp)
+    if state is None:
+        state = _polymod(1, [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp])
+        _hrp_states[hrp] = state
+    return state
+
+
+def _to_5bit(data: bytes) -> List[int]:
+    if len(data) == 0:
+        return []
+
+    bit_count = len(data) * 8
+    group_count = (bit_count + 4) // 5
+    value = int.from_bytes(data, "big") << (group_count * 5 - bit_count)
+    return [(value >> (5 * i)) & 31 for i in range(group_count - 1, -1, -1)]
+
+
+def _from_5bit(data_part: str) -> bytes:
+    if len(data_part) == 0:
+        return b""
+
+    bit_count = len(data_part) * 5
+    padding = bit_count % 8
+    value = int(data_part.translate(TO_BASE32), 32)
+    # same rules as convertbits(..., 5, 8, False)
+    if padding >= 5 or value & ((1 << padding) - 1):
+        raise ValueError("Invalid bits")
+    return (value >> padding).to_bytes(bit_count // 8, "big")
+
+
+def bech32m_encode(hrp: str, data: bytes) -> str:
+    groups = _to_5bit(data)
+    polymod = _polymod(_hrp_state(hrp), groups + [0, 0, 0, 0, 0, 0]) ^ BECH32M_CONST
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join([CHARSET[g] for g in groups + checksum])
+
+
+# returns (hrp, data) or raises ValueError
+def bech32m_decode(bech: str, max_length: int = DEFAULT_MAX_LENGTH) -> Tuple[str, bytes]:
+    if any(ord(x) < 33 or ord(x) > 126 for x in bech) or (bech.lower() != bech and bech.upper() != bech):
+        raise ValueError("Invalid characters")
+    bech = bech.lower()
+
+    pos = bech.rfind("1")
+    if pos < 1 or pos + 7 > len(bech) or len(bech) > max_length:
+        raise ValueError("Invalid length")
+
+    hrp = bech[:pos]
+    try:
+        groups = [CHARSET_VALUES[x] for x in bech[pos + 1:]]
+    except KeyError:
+        raise ValueError("Invalid characters")
+    if _polymod(_hrp_state(hrp), groups) != BECH32M_CONST:
+        raise ValueError("Invalid checksum")
+
+    return hrp, _from_5bit(bech[pos + 1:-6])
+
+
+def encode_signature(
+    origin_chain: bytes,
+    destination_chain: bytes,
+    nonce: bytes,
+    coin_id: bytes | None,
+    sig: bytes
+) -> str:
+    return bech32m_encode("r", origin_chain + destination_chain + nonce) + "-" + \
+        (bech32m_encode("c", coin_id) if coin_id is not None else "") + "-" + \
+        bech32m_encode("s", sig)
+
+
+def decode_signature(enc_sig: str) -> Tuple[
+    bytes,  # origin_chain
+    bytes,  # destination_chain
+    bytes,  # nonce
+    bytes | None,  # coin_id
+    bytes  # sig
+]:
+    parts = enc_sig.split("-")
+    _, route_data = bech32m_decode(parts[0], ROUTE_MAX_LENGTH)
+    coin_id = bech32m_decode(parts[1])[1] if parts[1] != "" else None
+    _, sig = bech32m_decode(parts[-1], SIG_MAX_LENGTH)
+
+    return route_data[:3], route_data[3:6], route_data[6:], coin_id, sig
+
+
+# decodes a batch of signatures; invalid entries are returned as None instead of raising
+def decode_many(enc_sigs: List[str]) -> List[Tuple[bytes, bytes, bytes, bytes | None, bytes] | None]:
+    decoded = []
+    for enc_sig in enc_sigs:
+        try:
+            decoded.append(decode_signature(enc_sig))
+        except (ValueError, IndexError):
+            decoded.append(None)
+    return decoded
+
@@ -0,0 +1,102 @@
+from chia.types.blockchain_format.program import Program
+from typing import Dict, List
+import bisect
+
+
+def nonce_to_int(nonce: bytes | int) -> int:
+    if isinstance(nonce, int):
+        return nonce
+    return int.from_bytes(nonce, "big")
+
+
+# in-memory index of the nonces used by a portal coin
+# for each source chain, keeps the contiguous prefix (all nonces from 1 to prefix are used)
+#  plus a sorted list of the used nonces above it
+# the on-chain/db format is the one described in ChiaFollower:
+#  [([chain] [a] [nonce1] [nonce2]), ...] -> chain used 1..a AND nonce1 AND nonce2
+# chain order is preserved (existing chains keep their position, new chains are appended)
+#  so serialized bytes are identical to the ones the portal puzzle produces
+class UsedNonces:
+    prefixes: Dict[bytes, int]
+    sparse: Dict[bytes, List[int]]
+
+    def __init__(self):
+        self.prefixes = {}
+        self.sparse = {}
+
+
+    @classmethod
+    def from_program(cls, data: Program) -> 'UsedNonces':
+        used = cls()
+        for chain_data in data.as_iter():
+            source_chain = chain_data.first().as_atom()
+            nonces = [_.as_int() for _ in chain_data.rest().as_iter()]
+            used.prefixes[source_chain] = nonces[0]
+            used.sparse[source_chain] = sorted(nonces[1:])
+        return used
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'UsedNonces':
+        return cls.from_program(Program.from_bytes(data))
+
+
+    def to_program(self) -> Program:
+        return Program.to([
+            [source_chain, prefix] + self.sparse[source_chain]
+            for source_chain, prefix in self.prefixes.items()
+        ])
+
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.to_program())
+
+
+    def copy(self) -> 'UsedNonces':
+        used = UsedNonces()
+        used.prefixes = dict(self.prefixes)
+        used.sparse = {source_chain: list(nonces) for source_chain, nonces in self.sparse.items()}
+        return used
+
+
+    def is_used(self, source_chain: bytes, nonce: bytes | int) -> bool:
+        prefix = self.prefixes.get(source_chain)
+        if prefix is None:
+            return False
+
+        nonce = nonce_to_int(nonce)
+        if nonce <= prefix:
+            return True
+
+        nonces = self.sparse[source_chain]
+        i = bisect.bisect_left(nonces, nonce)
+        return i < len(nonces) and nonces[i] == nonce
+
+
+    def add(self, source_chain: bytes, nonce: bytes | int):
+        nonce = nonce_to_int(nonce)
+        assert not self.is_used(source_chain, nonce)
+
+        if source_chain not in self.prefixes:
+            # same layout the portal uses for a chain's first nonce
+            if nonce == 1:
+                self.prefixes[source_chain] = 1
+                self.sparse[source_chain] = []
+            else:
+                self.prefixes[source_chain] = 0
+                self.sparse[source_chain] = [nonce]
+            return
+
+        nonces = self.sparse[source_chain]
+        bisect.insort(nonces, nonce)
+
+        # extend the contiguous prefix as far as the sparse nonces allow
+        prefix = self.prefixes[source_chain]
+        consumed = 0
+        while consumed < len(nonces) and nonces[consumed] == prefix + 1:
+            prefix += 1
+            consumed += 1
+
+        if consumed > 0:
+            del nonces[:consumed]
+            self.prefixes[source_chain] = prefix
@@ -1,26 +1,45 @@
 from commands.models import *
-from commands.config import get_config_item
+from commands.config import get_config_item, get_config_item_or_default
 from commands.cli_wrappers import get_node_client
 from chia.rpc.full_node_rpc_client import FullNodeRpcClient
-from chia.util.condition_tools import conditions_dict_for_solution
-from chia.types.blockchain_format.program import INFINITE_COST
-from chia.types.condition_opcodes import ConditionOpcode
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.program import Program
 from chia.consensus.block_record import BlockRecord
 from chia.types.coin_spend import CoinSpend
+from chia.types.spend_bundle import SpendBundle
 from chia.types.coin_record import CoinRecord
-from commands.followers.sig import encode_signature, decode_signature
+from commands.followers.sig_codec import encode_signature, decode_many
+from commands.followers.height_watcher import HeightWatcher
+from commands.followers.used_nonces import UsedNonces
+from commands.followers.conditions import ConditionExtractor
+from commands.followers.notifications import NotificationBus, new_message_topic, portal_rotated_topic
 from drivers.portal import BRIDGING_PUZZLE_HASH
-from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Set, Tuple
+import multiprocessing
 import logging
 import asyncio
+import heapq
 import sys
 from sqlalchemy import and_
 from chia_rs import AugSchemeMPL, PrivateKey
 
 SIG_USED_VALUE = b"used"
 
+# set once in each signing worker process, so the key isn't sent along with every message
+_worker_private_key: PrivateKey | None = None
+
+
+def _init_bls_worker(private_key_bytes: bytes):
+    global _worker_private_key
+    _worker_private_key = PrivateKey.from_bytes(private_key_bytes)
+
+
+# runs in a worker process, so it only takes/returns picklable bytes
+def _bls_sign(msg: bytes) -> bytes:
+    return bytes(AugSchemeMPL.sign(_worker_private_key, msg))
+
+
 class ChiaFollower:
     chain: str
     chain_id: bytes
@@ -32,8 +51,22 @@ class ChiaFollower:
     syncing: bool
     send_sig: any
     consecutive_portal_rollbacks: int
-
-    def __init__(self, chain: str, send_sig: any):
+    used_nonces: Tuple[bytes, UsedNonces] | None
+    scan_window: int
+    parent_fetch_concurrency: int
+    portal_catchup_batch_size: int
+    sign_processes: int
+    sign_pool_min_batch: int
+    sign_pool: ProcessPoolExecutor | None
+    notifications: NotificationBus
+    signer_poll_interval: int
+    mempool_poll_interval: float
+    presigned: Tuple[bytes, Dict[Tuple[bytes, bytes], bytes]] | None
+    conditions: ConditionExtractor
+    height_watcher: HeightWatcher
+    height_watcher_node: FullNodeRpcClient | None
+
+    def __init__(self, chain: str, send_sig: any, notifications: NotificationBus | None = None):
         self.chain = chain
         self.chain_id = chain.encode()
         self.private_key = PrivateKey.from_bytes(bytes.fromhex(get_config_item([chain, "my_hot_private_key"])))
@@ -43,7 +76,24 @@ class ChiaFollower:
         self.per_message_toll = int(get_config_item([chain, "per_message_toll"]))
         self.syncing = True
         self.send_sig = send_sig
+        self.notifications = notifications if notifications is not None else NotificationBus()
+        # signers are woken up by notifications; polling only picks up anything missed (e.g., after a crash)
+        self.signer_poll_interval = int(get_config_item_or_default([chain, "signer_poll_interval"], 120))
+        self.mempool_poll_interval = float(get_config_item_or_default([chain, "mempool_poll_interval"], 3))
+        self.presigned = None
+        self.conditions = ConditionExtractor(
+            max_cost=int(get_config_item_or_default([chain, "max_condition_cost"], 11_000_000_000))
+        )
         self.consecutive_portal_rollbacks = 0
+        self.used_nonces = None
+        self.scan_window = int(get_config_item_or_default([chain, "scan_window"], 2000))
+        self.parent_fetch_concurrency = int(get_config_item_or_default([chain, "parent_fetch_concurrency"], 8))
+        self.portal_catchup_batch_size = int(get_config_item_or_default([chain, "portal_catchup_batch_size"], 100))
+        self.sign_processes = int(get_config_item_or_default([chain, "sign_processes"], 4))
+        self.sign_pool_min_batch = int(get_config_item_or_default([chain, "sign_pool_min_batch"], 16))
+        self.sign_pool = None
+        self.height_watcher = HeightWatcher(chain, self.fetchPeakHeight, 5)
+        self.height_watcher_node = None
 
 
     async def getUnspentPortalId(self) -> bytes:
@@ -69,131 +119,176 @@ class ChiaFollower:
         return await get_node_client(self.chain, log)
 
 
-    # to save space, used_chains_and_nonces has a special format:
-    # [([chain] [a] [nonce1] [nonce2]), ...]
-    # the above would say that [chain] used all consecutive nonces from 1 to [a] (i.e., 1, 2, 3, ..., a) AND nonce1 AND nonce2
-    def check_already_used_chain_and_nonce(
-        self,
-        used_data: bytes,
-        source_chain: bytes,
-        nonce: bytes
-    ) -> bool:
-        used_data: Program = Program.from_bytes(used_data)
-        used_data_for_chain = None
-        for used_chain_and_nonce in used_data.as_iter():
-            if used_chain_and_nonce.first().as_atom() == source_chain:
-                used_data_for_chain = used_chain_and_nonce.rest()
-                break
+    # used chains and nonces of a portal coin, parsed once and reused until the portal moves
+    # see UsedNonces for the on-chain format
+    def getUsedNonces(self, portal_state: ChiaPortalState) -> UsedNonces:
+        if self.used_nonces is None or self.used_nonces[0] != portal_state.coin_id:
+            self.used_nonces = (portal_state.coin_id, UsedNonces.from_bytes(portal_state.used_chains_and_nonces))
+        return self.used_nonces[1]
+
+
+    # tree hash of [source_chain nonce source destination message]; only the portal id changes between signatures
+    def getMessageHash(self, message: Message) -> bytes:
+        if message.msg_hash is None:
+            source = message.source
+            while source.startswith(b'\x00'):
+                source = source[1:]
+            message.msg_hash = Program(Program.to([
+                message.source_chain,
+                message.nonce,
+                source,
+                message.destination,
+                split_message_contents(message.contents)
+            ])).get_tree_hash()
+
+        return message.msg_hash
+
+
+    async def signRawMessages(self, msgs: List[bytes]) -> List[bytes]:
+        if len(msgs) < self.sign_pool_min_batch:
+            return [bytes(AugSchemeMPL.sign(self.private_key, msg)) for msg in msgs]
+
+        # large batches (e.g., after a portal rotation) are spread across processes
+        if self.sign_pool is None:
+            # spawn, not fork: this process already runs other threads (nostr-sdk, aiohttp), and forking it can deadlock
+            self.sign_pool = ProcessPoolExecutor(
+                max_workers=self.sign_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_bls_worker,
+                initargs=(bytes(self.private_key),)
+            )
+        return await asyncio.gather(*[
+            self.loop.run_in_executor(self.sign_pool, _bls_sign, msg)
+            for msg in msgs
+        ])
 
-        if used_data_for_chain is None:
-            return False
-        
-        nonce: int = int(nonce.hex(), 16)
-        if used_data_for_chain.first().as_int() >= nonce:
-            return True
-        
-        for used_nonce in used_data_for_chain.rest().as_iter():
-            if used_nonce.as_int() == nonce:
-                return True
-        return False
 
+    async def signMessages(self, db, messages: List[Message]):
+        if len(messages) == 0:
+            return
 
-    # for format, see note of function above
-    def add_chain_and_nonce(
-        self,
-        base_data: Program,
-        source_chain: bytes,
-        nonce: bytes
-    ) -> Program:
-        nonce: int = int(nonce.hex(), 16)
-
-        chain_data_parts = []
-        found = False
-
-        for chain_data in base_data.as_iter():
-            if chain_data.first() != source_chain:
-                chain_data_parts.append(chain_data)
+        portal_id = await self.getUnspentPortalId()
+        portal_state = db.query(ChiaPortalState).filter(
+            ChiaPortalState.coin_id == portal_id
+        ).first()
+        if portal_state is None:
+            logging.error(f"Portal coin {self.chain}-0x{portal_id.hex()}: not found in db. Not signing {len(messages)} message(s).")
+            return
+
+        used_nonces = self.getUsedNonces(portal_state)
+        suffix = portal_id + bytes.fromhex(get_config_item([self.chain, "agg_sig_data"]))
+
+        to_sign: List[Message] = []
+        for message in messages:
+            logging.info(f"{self.chain}: Signing message {message.source_chain.decode()}-0x{message.nonce.hex()}")
+            assert message.destination_chain == self.chain_id
+
+            if used_nonces.is_used(message.source_chain, message.nonce):
+                logging.error(f"Chain {self.chain}-0x{message.nonce.hex()}: nonce already used. Not signing message.")
+                message.sig = SIG_USED_VALUE
                 continue
 
-            # to add an item: treat all nonces (including [a]) as an integer list
-            # add nonce, sort the list
-            # then, if a == nonce1 - 1, a = nonce1, pop nonce1 - up until the first time the condition is false
-            found = True
-            chain_data_ints = [_.as_int() for _ in chain_data.rest().as_iter()]
-
-            assert chain_data_ints[0] < nonce and nonce not in chain_data_ints
-            chain_data_ints.append(nonce)
-            chain_data_ints.sort()
-
-            while len(chain_data_ints) > 1 and chain_data_ints[0] + 1 == chain_data_ints[1]:
-                chain_data_ints[0] += 1
-                chain_data_ints.pop(1)
-
-            chain_data_parts.append(Program.to([source_chain] + chain_data_ints))
-
-        if not found:
-            if nonce == 1:
-                chain_data_parts.append(Program.to([source_chain, nonce]))
-            else:
-                chain_data_parts.append(Program.to([source_chain, 0, nonce]))
-
-        return Program.to(chain_data_parts)
-
-
-    async def signMessage(self, db, message: Message):
-        logging.info(f"{self.chain}: Signing message {message.source_chain.decode()}-0x{message.nonce.hex()}")
-
-        assert message.destination_chain == self.chain_id
-        source = message.source
-        while source.startswith(b'\x00'):
-            source = source[1:]
-        # source_chain nonce source destination message
-        msg_bytes: bytes = Program(Program.to([
-            message.source_chain,
-            message.nonce,
-            source,
-            message.destination,
-            split_message_contents(message.contents)
-        ])).get_tree_hash()
-        
-        portal_id = await self.getUnspentPortalId()
+            to_sign.append(message)
+
+        # signatures computed while the spend that created this portal coin was still in the mempool
+        presigned = self.presigned[1] if self.presigned is not None and self.presigned[0] == portal_id else {}
+        not_presigned = [m for m in to_sign if (bytes(m.source_chain), bytes(m.nonce)) not in presigned]
+        if len(presigned) > 0:
+            logging.info(f"{self.chain} Signer: using {len(to_sign) - len(not_presigned)} pre-computed signature(s) for portal coin 0x{portal_id.hex()}")
+
+        new_sigs = await self.signRawMessages([self.getMessageHash(message) + suffix for message in not_presigned])
+        sigs_by_message = dict(presigned)
+        for message, sig in zip(not_presigned, new_sigs):
+            sigs_by_message[(bytes(message.source_chain), bytes(message.nonce))] = sig
+        sigs = [sigs_by_message[(bytes(message.source_chain), bytes(message.nonce))] for message in to_sign]
+
+        for message, sig in zip(to_sign, sigs):
+            logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Raw signature: {sig.hex()}")
+            message.sig = encode_signature(
+                message.source_chain,
+                message.destination_chain,
+                message.nonce,
+                portal_id,
+                sig
+            ).encode()
+        db.commit()
+
+        for message in to_sign:
+            logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Signature: {message.sig.decode()}")
+            self.send_sig(message.sig.decode())
+
+
+    # if a spend of the current portal coin is in the mempool, signs all pending messages for the
+    #  coin it will create, so the signatures can be published as soon as the spend confirms
+    async def presignFromMempool(self, db, node: FullNodeRpcClient):
+        portal_id = self.unspent_portal_id
+        if self.syncing or portal_id is None:
+            return
+
+        response = await node.get_mempool_items_by_coin_name(portal_id)
+        portal_spend = None
+        for item in response.get("mempool_items", []):
+            for coin_spend in SpendBundle.from_json_dict(item["spend_bundle"]).coin_spends:
+                if coin_spend.coin.name() == portal_id:
+                    portal_spend = coin_spend
+        if portal_spend is None:
+            return
+
+        new_ph, chains_and_nonces = self.parsePortalSpend(portal_spend)
+        if new_ph is None:
+            return
+        predicted_portal_id = Coin(portal_id, new_ph, 1).name()
+
         portal_state = db.query(ChiaPortalState).filter(
             ChiaPortalState.coin_id == portal_id
         ).first()
         if portal_state is None:
-            logging.error(f"Portal coin {self.chain}-0x{portal_id.hex()}: not found in db. Not signing message.")
             return
-        
-        if self.check_already_used_chain_and_nonce(
-            portal_state.used_chains_and_nonces,
-            message.source_chain,
-            message.nonce
-        ):
-            logging.error(f"Chain {self.chain}-0x{message.nonce.hex()}: nonce already used. Not signing message.")
-            message.sig = SIG_USED_VALUE
+
+        used_nonces = self.getUsedNonces(portal_state).copy()
+        for source_chain, nonce in chains_and_nonces:
+            if not used_nonces.is_used(source_chain, nonce):
+                used_nonces.add(source_chain, nonce)
+
+        if self.presigned is None or self.presigned[0] != predicted_portal_id:
+            self.presigned = (predicted_portal_id, {})
+        presigned = self.presigned[1]
+
+        messages = [m for m in db.query(Message).filter(and_(
+            Message.destination_chain == self.chain_id,
+            Message.sig != SIG_USED_VALUE
+        )).all() if (bytes(m.source_chain), bytes(m.nonce)) not in presigned and not used_nonces.is_used(m.source_chain, m.nonce)]
+        if len(messages) == 0:
             db.commit()
-            return     
-        
-        msg_bytes = msg_bytes + portal_id + bytes.fromhex(get_config_item([self.chain, "agg_sig_data"]))
-
-        sig = AugSchemeMPL.sign(self.private_key, msg_bytes)
-        logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Raw signature: {bytes(sig).hex()}")
-
-        message.sig = encode_signature(
-            message.source_chain,
-            message.destination_chain,
-            message.nonce,
-            portal_id,
-            bytes(sig)
-        ).encode()
+            return
+
+        suffix = predicted_portal_id + bytes.fromhex(get_config_item([self.chain, "agg_sig_data"]))
+        sigs = await self.signRawMessages([self.getMessageHash(message) + suffix for message in messages])
+        for message, sig in zip(messages, sigs):
+            presigned[(bytes(message.source_chain), bytes(message.nonce))] = sig
+        # persists any newly computed message hashes and ends the read transaction
         db.commit()
-        logging.info(f"{self.chain} Signer: {message.source_chain.decode()}-{message.nonce.hex()}: Signature: {message.sig.decode()}")
 
-        self.send_sig(message.sig.decode())
+        logging.info(f"{self.chain}: portal coin 0x{portal_id.hex()} is being spent in the mempool; pre-signed {len(messages)} message(s) for 0x{predicted_portal_id.hex()}")
+
+
+    async def mempoolWatcher(self):
+        db = self.getDb()
+        node = await self.getNode()
+
+        while True:
+            try:
+                await self.presignFromMempool(db, node)
+            except:
+                logging.warning(f"{self.chain} mempool watcher: error when pre-signing messages", exc_info=True)
+                db.rollback()
+
+            await asyncio.sleep(self.mempool_poll_interval)
 
 
     async def messageSigner(self):
         db = self.getDb()
+        wakeup = self.notifications.subscribe(new_message_topic(self.chain_id), portal_rotated_topic(self.chain_id))
 
         while not self.syncing:
             logging.info(f"{self.chain_id.decode} message signer: Waiting to be synced before signing messages...")
@@ -211,15 +306,13 @@ class ChiaFollower:
                 logging.error(f"Error querying messages: {e}", exc_info=True)
                 sys.exit(1)
 
-            for message in messages:
-                try:
-                    await self.signMessage(db, message)
-                    db.commit()
-                except Exception as e:
-                    logging.error(f"Error signing message {message.nonce.hex()}: {e}", exc_info=True)
-                    sys.exit(1)
+            try:
+                await self.signMessages(db, messages)
+            except Exception as e:
+                logging.error(f"Error signing messages {[message.nonce.hex() for message in messages]}: {e}", exc_info=True)
+                sys.exit(1)
 
-            await asyncio.sleep(5)
+            await self.notifications.wait(wakeup, self.signer_poll_interval)
 
 
     async def get_coin_record_by_name(self, node: FullNodeRpcClient, coin_id: bytes, tries: int = -1) -> CoinRecord:
@@ -246,6 +339,24 @@ class ChiaFollower:
         return spend
     
 
+    # returns the puzzle hash of the new singleton (None if not found) and the (source_chain, nonce) pairs used by the spend
+    def parsePortalSpend(self, spend: CoinSpend, spent_height: int | None = None) -> Tuple[bytes | None, List[Tuple[bytes, bytes]]]:
+        new_ph = None
+        for create_coin in self.conditions.create_coins(spend, spent_height):
+            if create_coin.amount == 1:
+                new_ph = create_coin.puzzle_hash
+                break
+        if new_ph is None:
+            return None, []
+
+        inner_solution: Program = Program.from_bytes(bytes(spend.solution)).at("rrf")
+        update_package = inner_solution.at("f")
+        if bytes(update_package) != bytes(Program.to(0)):
+            return new_ph, []
+
+        return new_ph, [(cn.first().as_atom(), cn.rest().as_atom()) for cn in inner_solution.at("rf").as_iter()]
+
+
     async def syncPortal(
         self,
         db,
@@ -279,21 +390,15 @@ class ChiaFollower:
                 last_synced_portal.confirmed_block_height = None
                 return parent_state
             
-            # else, unspent - just wait patiently
+            # else, unspent - just wait patiently (a spend can only show up in a new block)
             self.syncing = False
             await self.setUnspentPortalId(last_synced_portal.coin_id)
-            await asyncio.sleep(5)
+            await self.height_watcher.wait_for_next(timeout=30)
             return last_synced_portal
 
         # spent!
         spend = await self.get_puzzle_and_solution(node, last_synced_portal.coin_id, coin_record.spent_block_index)
-        conds = conditions_dict_for_solution(spend.puzzle_reveal, spend.solution, INFINITE_COST)
-        create_coins = conds[ConditionOpcode.CREATE_COIN]
-        new_ph = None
-        for cond in create_coins:
-            if cond.vars[1] == b'\x01':
-                new_ph = cond.vars[0]
-                break
+        new_ph, chains_and_nonces = self.parsePortalSpend(spend, coin_record.spent_block_index)
         if new_ph is None:
             logging.error(f"Portal coin {self.chain}-0x{last_synced_portal.coin_id.hex()}: no singleton found in spend; reverting.")
             parent_state = db.query(ChiaPortalState).filter(
@@ -302,22 +407,12 @@ class ChiaFollower:
             last_synced_portal.confirmed_block_height = None
             return parent_state
 
-        inner_solution: Program = Program.from_bytes(bytes(spend.solution)).at("rrf")
-        update_package = inner_solution.at("f")
+        # updated in place - drop the cached entry so a failed sync can't leave a half-applied index behind
+        used_nonces = self.getUsedNonces(last_synced_portal)
+        self.used_nonces = None
 
-        prev_used_chains_and_nonces = Program.from_bytes(last_synced_portal.used_chains_and_nonces)
-        if len(prev_used_chains_and_nonces.as_python()) == 0:
-            prev_used_chains_and_nonces = Program.to([])
-        
-        chains_and_nonces = inner_solution.at("rf").as_iter() if bytes(update_package) == bytes(Program.to(0)) else []
-        for cn in chains_and_nonces:
-            source_chain = cn.first().as_atom()
-            nonce = cn.rest().as_atom()
-            prev_used_chains_and_nonces = self.add_chain_and_nonce(
-                prev_used_chains_and_nonces,
-                source_chain,
-                nonce
-            )
+        for source_chain, nonce in chains_and_nonces:
+            used_nonces.add(source_chain, nonce)
 
             msg = db.query(Message).filter(and_(
                 Message.source_chain == source_chain,
@@ -333,7 +428,7 @@ class ChiaFollower:
                 
             msg.sig = SIG_USED_VALUE
 
-        chains_and_nonces = bytes(Program.to(prev_used_chains_and_nonces))
+        chains_and_nonces = bytes(used_nonces)
        
         new_singleton = Coin(
             last_synced_portal.coin_id,
@@ -353,6 +448,8 @@ class ChiaFollower:
         )
         db.add(new_synced_portal)
         db.commit()
+        self.used_nonces = (new_synced_portal.coin_id, used_nonces)
+        self.notifications.publish(portal_rotated_topic(self.chain_id))
 
         logging.info(f"New portal coin: {self.chain}-0x{new_synced_portal.coin_id.hex()}")
 
@@ -368,17 +465,146 @@ class ChiaFollower:
                 Message.destination_chain == self.chain_id,
                 Message.sig != SIG_USED_VALUE
             )).all()
-            for message in messages:
-                try:
-                    _, __, ___, coin_id, ____ = decode_signature(message.sig.decode())
-                    if coin_id != new_synced_portal.coin_id:
-                        await self.signMessage(db, message)
-                except:
-                    logging.info(f"Message {self.chain}-{message.nonce.hex()}: error when decoding signature/signing - {message.sig.decode()}", exc_info=True)
+            to_resign = []
+            for message, decoded in zip(messages, decode_many([message.sig.decode() for message in messages])):
+                if decoded is None:
+                    logging.info(f"Message {self.chain}-{message.nonce.hex()}: error when decoding signature - {message.sig.decode()}")
+                    continue
+                if decoded[3] != new_synced_portal.coin_id:
+                    to_resign.append(message)
+
+            try:
+                await self.signMessages(db, to_resign)
+            except:
+                logging.info(f"{self.chain}: error when re-signing {len(to_resign)} message(s)", exc_info=True)
 
         return new_synced_portal
     
 
+    # (source_chain, nonce) -> message for all given pairs that are already in the db
+    def getMessagesByChainAndNonce(self, db, chains_and_nonces: List[Tuple[bytes, bytes]]) -> Dict[Tuple[bytes, bytes], Message]:
+        nonces_by_chain: Dict[bytes, List[bytes]] = {}
+        for source_chain, nonce in chains_and_nonces:
+            nonces_by_chain.setdefault(source_chain, []).append(nonce)
+
+        messages = {}
+        for source_chain, nonces in nonces_by_chain.items():
+            for i in range(0, len(nonces), 500):
+                for msg in db.query(Message).filter(and_(
+                    Message.source_chain == source_chain,
+                    Message.nonce.in_(nonces[i:i + 500])
+                )).all():
+                    messages[(bytes(msg.source_chain), bytes(msg.nonce))] = msg
+
+        return messages
+
+
+    # replays confirmed portal spends in bulk: walks the singleton lineage by parent id while
+    #  the spends are fetched concurrently, then writes each batch of ChiaPortalState rows in one commit
+    # stops before spends that are less than sign_min_height blocks deep; syncPortal takes over from there
+    async def catchUpPortal(
+        self,
+        db,
+        node: FullNodeRpcClient,
+        last_synced_portal: ChiaPortalState
+    ) -> ChiaPortalState:
+        semaphore = asyncio.Semaphore(self.parent_fetch_concurrency)
+
+        async def fetch_spend(coin_record: CoinRecord) -> CoinSpend:
+            async with semaphore:
+                return await self.get_puzzle_and_solution(node, coin_record.coin.name(), coin_record.spent_block_index)
+
+        coin_record = await node.get_coin_record_by_name(last_synced_portal.coin_id)
+        replayed = 0
+        while True:
+            safe_height = (await self.height_watcher.get_peak()) - self.sign_min_height
+
+            # walk the lineage: each portal spend creates exactly one odd-amount (singleton) child
+            lineage: List[Tuple[CoinRecord, CoinRecord, asyncio.Future]] = []
+            spend_tasks: List[asyncio.Future] = []
+            new_states: List[ChiaPortalState] = []
+            used_chains_and_nonces: List[Tuple[bytes, bytes]] = []
+            try:
+                while coin_record is not None and \
+                    coin_record.spent_block_index > 0 and \
+                    coin_record.spent_block_index <= safe_height and \
+                    len(lineage) < self.portal_catchup_batch_size:
+                    spend_task = asyncio.ensure_future(fetch_spend(coin_record))
+                    spend_tasks.append(spend_task)
+                    children = await node.get_coin_records_by_parent_ids([coin_record.coin.name()], include_spent_coins=True)
+                    singletons = [c for c in children if c.coin.amount % 2 == 1]
+                    if len(singletons) != 1:
+                        spend_task.cancel()
+                        break
+
+                    lineage.append((coin_record, singletons[0], spend_task))
+                    coin_record = singletons[0]
+
+                if len(lineage) == 0:
+                    break
+
+                used_nonces = self.getUsedNonces(last_synced_portal)
+                self.used_nonces = None
+
+                for parent_record, child_record, spend_task in lineage:
+                    new_ph, chains_and_nonces = self.parsePortalSpend(await spend_task, parent_record.spent_block_index)
+                    if new_ph != child_record.coin.puzzle_hash:
+                        # unexpected spend - leave it to syncPortal
+                        logging.warning(f"Portal coin {self.chain}-0x{parent_record.coin.name().hex()}: spend does not match lineage; stopping catch-up")
+                        for task in spend_tasks:
+                            task.cancel()
+                        coin_record = None
+                        break
+
+                    for source_chain, nonce in chains_and_nonces:
+                        used_nonces.add(source_chain, nonce)
+                    used_chains_and_nonces += chains_and_nonces
+
+                    new_states.append(ChiaPortalState(
+                        chain_id=self.chain_id,
+                        coin_id=child_record.coin.name(),
+                        parent_id=parent_record.coin.name(),
+                        used_chains_and_nonces=bytes(used_nonces),
+                        confirmed_block_height=parent_record.spent_block_index,
+                    ))
+            except:
+                # don't leave spend fetches running in the background
+                for task in spend_tasks:
+                    task.cancel()
+                raise
+
+            if len(new_states) == 0:
+                break
+
+            messages = self.getMessagesByChainAndNonce(db, used_chains_and_nonces)
+            while len(messages) < len(set(used_chains_and_nonces)):
+                logging.info(f"{self.chain} portal catch-up: {len(set(used_chains_and_nonces)) - len(messages)} used messages not found in db; waiting 10s for other threads to catch up")
+                await asyncio.sleep(10)
+                messages = self.getMessagesByChainAndNonce(db, used_chains_and_nonces)
+
+            for msg in messages.values():
+                msg.sig = SIG_USED_VALUE
+
+            parent_ids = [state.parent_id for state in new_states]
+            for i in range(0, len(parent_ids), 500):
+                db.query(ChiaPortalState).filter(
+                    ChiaPortalState.parent_id.in_(parent_ids[i:i + 500])
+                ).delete()
+            db.add_all(new_states)
+            db.commit()
+
+            last_synced_portal = new_states[-1]
+            self.used_nonces = (last_synced_portal.coin_id, used_nonces)
+            self.notifications.publish(portal_rotated_topic(self.chain_id))
+            replayed += len(new_states)
+            logging.info(f"{self.chain} portal catch-up: replayed {replayed} spends; latest portal coin: {self.chain}-0x{last_synced_portal.coin_id.hex()}")
+
+            if coin_record is None:
+                break
+
+        return last_synced_portal
+
+
     async def portalFollower(self):
         db = self.getDb()
         node = await self.getNode()
@@ -395,11 +621,10 @@ class ChiaFollower:
             assert launcher_coin_record.spent_block_index > 0
 
             launcher_spend = await self.get_puzzle_and_solution(node, portal_launcher_id, launcher_coin_record.spent_block_index)
-            conds = conditions_dict_for_solution(launcher_spend.puzzle_reveal, launcher_spend.solution, INFINITE_COST)
-            create_coins = conds[ConditionOpcode.CREATE_COIN]
-            assert len(create_coins) == 1 and create_coins[0].vars[1] == b'\x01'
+            create_coins = self.conditions.create_coins(launcher_spend, launcher_coin_record.spent_block_index)
+            assert len(create_coins) == 1 and create_coins[0].amount == 1
 
-            singleton_full_puzzle_hash = create_coins[0].vars[0]
+            singleton_full_puzzle_hash = create_coins[0].puzzle_hash
             first_singleton = Coin(
                 portal_launcher_id,
                 singleton_full_puzzle_hash,
@@ -418,7 +643,12 @@ class ChiaFollower:
 
         logging.info(f"Latest portal coin: {self.chain}-0x{last_synced_portal.coin_id.hex()}")
 
-        last_synced_portal = await self.syncPortal(db, node, last_synced_portal)
+        try:
+            last_synced_portal = await self.catchUpPortal(db, node, last_synced_portal)
+            last_synced_portal = await self.syncPortal(db, node, last_synced_portal)
+        except:
+            logging.error(f"{self.chain_id.decode()} portal follower: Error catching up from portal coin {self.chain_id.decode()}-0x{last_synced_portal.coin_id.hex()}", exc_info=True)
+            sys.exit(1)
 
         while True:
             try:
@@ -482,53 +712,117 @@ class ChiaFollower:
         db.add(msg)
         db.commit()
         logging.info(f"Message {self.chain}-{nonce.hex()} added to db.")
+        self.notifications.publish(new_message_topic(destination_chain))
 
 
-    async def processCoinRecord(self, db: any, node: FullNodeRpcClient, coin_record: CoinRecord):
-        parent_record = await self.get_coin_record_by_name(node, coin_record.coin.parent_coin_info)
-        parent_spend = await self.get_puzzle_and_solution(
-            node,
-            coin_record.coin.parent_coin_info,
-            parent_record.spent_block_index
-        )
+    # returns coin records for all given names (spent or unspent) using bulk queries
+    async def get_coin_records_by_names(self, node: FullNodeRpcClient, coin_ids: List[bytes]) -> Dict[bytes, CoinRecord]:
+        coin_records = {}
+        for i in range(0, len(coin_ids), 1000):
+            for coin_record in await node.get_coin_records_by_names(coin_ids[i:i + 1000], include_spent_coins=True):
+                coin_records[bytes(coin_record.coin.name())] = coin_record
+
+        return coin_records
+
+
+    # starts fetching parent spends concurrently; results should be awaited in confirmation order
+    def resolveParentSpends(
+        self,
+        node: FullNodeRpcClient,
+        parent_ids: List[bytes],
+        known_coin_records: Dict[bytes, CoinRecord]
+    ) -> Dict[bytes, asyncio.Future]:
+        semaphore = asyncio.Semaphore(self.parent_fetch_concurrency)
+
+        async def resolve(parent_id: bytes) -> Tuple[CoinRecord, CoinSpend]:
+            async with semaphore:
+                parent_record = known_coin_records.get(parent_id)
+                if parent_record is None:
+                    parent_record = await self.get_coin_record_by_name(node, parent_id)
+                parent_spend = await self.get_puzzle_and_solution(node, parent_id, parent_record.spent_block_index)
+                return parent_record, parent_spend
 
+        return {parent_id: asyncio.ensure_future(resolve(parent_id)) for parent_id in parent_ids}
+
+
+    async def processParentSpend(self, db: any, parent_record: CoinRecord, parent_spend: CoinSpend):
         try:
-            _, output = parent_spend.puzzle_reveal.run_with_cost(INFINITE_COST, parent_spend.solution)
-            for condition in output.as_iter():
-                if condition.first().as_int() == 51: # CREATE_COIN
-                    created_ph = condition.at('rf').as_atom()
-                    created_amount = condition.at('rrf').as_int()
-
-                    if created_ph == BRIDGING_PUZZLE_HASH and created_amount >= self.per_message_toll:
-                        coin = Coin(parent_record.coin.name(), created_ph, created_amount)
-                        try:
-                            memo = condition.at('rrrf')
-                        except:
-                            logging.error(f"Coin {self.chain}-{coin.name().hex()} - error when parsing memo; skipping")
-                            continue
-
-                        try:
-                            await self.createMessageFromMemo(
-                                db,
-                                coin.name(),
-                                parent_record.coin.puzzle_hash,
-                                parent_record.spent_block_index,
-                                memo
-                            )
-                        except Exception as e:
-                            logging.error(f"Coin {self.chain}-{coin.name().hex()} - error when parsing memo to create message; skipping even though we shouldn't")
-                            logging.error(e)
-        except Exception as e:
-            logging.error(f"Coin {self.chain}-{coin_record.coin.name().hex()} - error when parsing output; skipping")
-
-
-    async def get_current_height(self, node: FullNodeRpcClient) -> int:
+            for create_coin in self.conditions.create_coins(parent_spend, parent_record.spent_block_index):
+                created_ph = create_coin.puzzle_hash
+                created_amount = create_coin.amount
+
+                if created_ph == BRIDGING_PUZZLE_HASH and created_amount >= self.per_message_toll:
+                    coin = Coin(parent_record.coin.name(), created_ph, created_amount)
+                    memo = create_coin.memos
+                    if memo is None:
+                        logging.error(f"Coin {self.chain}-{coin.name().hex()} - error when parsing memo; skipping")
+                        continue
+
+                    try:
+                        await self.createMessageFromMemo(
+                            db,
+                            coin.name(),
+                            parent_record.coin.puzzle_hash,
+                            parent_record.spent_block_index,
+                            memo
+                        )
+                    except Exception as e:
+                        logging.error(f"Coin {self.chain}-{coin.name().hex()} - error when parsing memo to create message; skipping even though we shouldn't")
+                        logging.error(e)
+        except Exception:
+            logging.error(f"Coin {self.chain}-{parent_record.coin.name().hex()} - error when parsing output of bridging coin parent; skipping", exc_info=True)
+
+
+    async def fetchPeakHeight(self) -> int:
+        if self.height_watcher_node is None:
+            self.height_watcher_node = await self.getNode()
         try:
-            return (await node.get_blockchain_state())["peak"].height
-        except Exception as e:
-            logging.error(f"Error getting current height for {self.chain}; sleeping 5s and making it appear everything is unconfirmed", exc_info=True)
-            await asyncio.sleep(5)
-            return 0
+            return (await self.height_watcher_node.get_blockchain_state())["peak"].height
+        except:
+            # reconnect on the next poll
+            self.height_watcher_node.close()
+            await self.height_watcher_node.await_closed()
+            self.height_watcher_node = None
+            raise
+
+
+    # returns the subset of nonces that already have a message in the db
+    def getKnownNonces(self, db, nonces: List[bytes]) -> Set[bytes]:
+        known_nonces = set()
+        # stay well below sqlite's limit on the number of query parameters
+        for i in range(0, len(nonces), 500):
+            rows = db.query(Message.nonce).filter(and_(
+                Message.source_chain == self.chain_id,
+                Message.nonce.in_([bytes(n) for n in nonces[i:i + 500]])
+            )).all()
+            known_nonces.update([bytes(row[0]) for row in rows])
+
+        return known_nonces
+
+
+    # last height (inclusive) the message listener has fully processed
+    def getScanCursor(self, db) -> int:
+        cursor = db.query(ScanCursor).filter(ScanCursor.chain_id == self.chain_id).first()
+        if cursor is not None:
+            return cursor.height
+
+        # first run with a cursor - start from the latest message, like before
+        last_synced_height = db.query(Message.block_number).filter(
+            Message.source_chain == self.chain_id
+        ).order_by(Message.block_number.desc()).first()
+
+        if last_synced_height is None:
+            return get_config_item([self.chain, 'min_height']) - 1
+        return last_synced_height[0] - 2
+
+
+    def setScanCursor(self, db, height: int):
+        cursor = db.query(ScanCursor).filter(ScanCursor.chain_id == self.chain_id).first()
+        if cursor is None:
+            db.add(ScanCursor(chain_id=self.chain_id, height=height))
+        else:
+            cursor.height = height
+        db.commit()
 
 
     async def messageListener(self):
@@ -537,70 +831,81 @@ class ChiaFollower:
 
         while True:
             try:
-                last_synced_height = db.query(Message.block_number).filter(
-                    Message.source_chain == self.chain_id
-                ).order_by(Message.block_number.desc()).first()
+                scanned_height = self.getScanCursor(db)
 
-                if last_synced_height is None:
-                    last_synced_height = get_config_item([self.chain, 'min_height'])
-                else:
-                    last_synced_height = last_synced_height[0]
+                # only scan blocks that are already deep enough to be signed
+                confirmed_height = (await self.height_watcher.get_peak()) - self.sign_min_height
+                if confirmed_height <= scanned_height:
+                    await self.height_watcher.wait_for(scanned_height + 1 + self.sign_min_height, timeout=60)
+                    continue
 
+                scan_end_height = min(scanned_height + self.scan_window, confirmed_height)
                 unfiltered_coin_records = await node.get_coin_records_by_puzzle_hash(
                     BRIDGING_PUZZLE_HASH,
                     include_spent_coins=True,
-                    start_height=last_synced_height - 1
+                    start_height=scanned_height + 1,
+                    end_height=scan_end_height + 1 # exclusive
                 )
                 if unfiltered_coin_records is None:
                     await asyncio.sleep(30)
                     continue
 
-                # because get_coin_records_by_puzzle_hash can be quite resource exensive, we'll process all results
-                # instead of only one and calling again
-                skip_coin_ids = []
-                reorg = False
-                while not reorg:
-                    earliest_unprocessed_coin_record = None
-                    for coin_record in unfiltered_coin_records:
-                        nonce = coin_record.coin.name()
-                        if nonce in skip_coin_ids:
-                            continue
-
-                        if coin_record.coin.amount < self.per_message_toll:
-                            skip_coin_ids.append(nonce)
-                            continue
-
-                        message_in_db = db.query(Message).filter(and_(
-                            Message.nonce == nonce,
-                            Message.source_chain == self.chain_id
-                        )).first()
-                        if message_in_db is not None:
-                            skip_coin_ids.append(nonce)
-                            continue
-
-                        if earliest_unprocessed_coin_record is None or coin_record.confirmed_block_index < earliest_unprocessed_coin_record.confirmed_block_index:
-                            earliest_unprocessed_coin_record = coin_record
-
-                    if earliest_unprocessed_coin_record is None:
-                        break
-
-                    # wait for this to actually be confirmed :)
-                    while earliest_unprocessed_coin_record.confirmed_block_index + self.sign_min_height > (await self.get_current_height(node)):
-                        await asyncio.sleep(10)
-
-                    coin_record_copy = await self.get_coin_record_by_name(node, earliest_unprocessed_coin_record.coin.name(), 3)
-                    if coin_record_copy is None or coin_record_copy.confirmed_block_index != earliest_unprocessed_coin_record.confirmed_block_index:
-                        logging.info(f"{self.chain} message follower: Coin {self.chain}-0x{earliest_unprocessed_coin_record.coin.name().hex()}: possible reorg; re-processing")
-                        reorg = True
-                        break
-
-                    await self.processCoinRecord(db, node, earliest_unprocessed_coin_record)
+                # process all results of the window instead of only one and calling again
+                # one bulk query finds the nonces that are already known; the rest is processed
+                # in confirmation order
+                candidate_coin_records = [cr for cr in unfiltered_coin_records if cr.coin.amount >= self.per_message_toll]
+                known_nonces = self.getKnownNonces(db, [cr.coin.name() for cr in candidate_coin_records])
+
+                unprocessed_coin_records = [
+                    (cr.confirmed_block_index, i, cr) for i, cr in enumerate(candidate_coin_records)
+                    if bytes(cr.coin.name()) not in known_nonces
+                ]
+                heapq.heapify(unprocessed_coin_records)
+
+                # parents that create several bridging coins only need to be processed once
+                ordered_coin_records = []
+                parent_ids = []
+                seen_parent_ids = set()
+                while len(unprocessed_coin_records) > 0:
+                    _, __, coin_record = heapq.heappop(unprocessed_coin_records)
+                    parent_id = bytes(coin_record.coin.parent_coin_info)
+                    if parent_id in seen_parent_ids:
+                        continue
+                    seen_parent_ids.add(parent_id)
+                    ordered_coin_records.append(coin_record)
+                    parent_ids.append(parent_id)
+
+                # the window only contains confirmed heights, so one bulk query can re-check the
+                # bridging coins (and return their parents) up front; parent spends are then fetched concurrently
+                current_coin_records = await self.get_coin_records_by_names(
+                    node,
+                    [bytes(cr.coin.name()) for cr in ordered_coin_records] + parent_ids
+                )
+                parent_spends = self.resolveParentSpends(node, parent_ids, current_coin_records)
 
-                    nonce = earliest_unprocessed_coin_record.coin.name()
-                    skip_coin_ids.append(nonce)
+                reorg = False
+                try:
+                    for coin_record, parent_id in zip(ordered_coin_records, parent_ids):
+                        # wait for this to actually be confirmed :)
+                        while coin_record.confirmed_block_index + self.sign_min_height > self.height_watcher.peak:
+                            await self.height_watcher.wait_for(coin_record.confirmed_block_index + self.sign_min_height)
+
+                        coin_record_copy = current_coin_records.get(bytes(coin_record.coin.name()))
+                        if coin_record_copy is None or coin_record_copy.confirmed_block_index != coin_record.confirmed_block_index:
+                            logging.info(f"{self.chain} message follower: Coin {self.chain}-0x{coin_record.coin.name().hex()}: possible reorg; re-processing")
+                            reorg = True
+                            break
+
+                        parent_record, parent_spend = await parent_spends[parent_id]
+                        await self.processParentSpend(db, parent_record, parent_spend)
+                finally:
+                    for parent_spend in parent_spends.values():
+                        parent_spend.cancel()
+
+                if reorg:
+                    continue
 
-                if not reorg:
-                    await asyncio.sleep(30)
+                self.setScanCursor(db, scan_end_height)
             except:
                 logging.error(f"{self.chain_id.decode()} message listener: error", exc_info=True)
                 sys.exit(1)
@@ -613,9 +918,11 @@ class ChiaFollower:
     def run(self, loop):
         self.loop = loop
 
+        self.loop.create_task(self.height_watcher.run())
         self.loop.create_task(self.messageSigner())
         self.loop.create_task(self.portalFollower())
         self.loop.create_task(self.messageListener())
+        self.loop.create_task(self.mempoolWatcher())
 
     async def wait_for_node(self, log: bool = True):
         while True:
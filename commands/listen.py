@@ -5,6 +5,7 @@ import logging
 from commands.followers.eth_follower import EthereumFollower
 from commands.followers.xch_follower import ChiaFollower
 from commands.followers.sig import MessageBroadcaster
+from commands.followers.notifications import NotificationBus
 import asyncio
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,13 +14,14 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 @click.command()
 def listen(log_startup_connection_errors: bool):
     msg_broadcaster = MessageBroadcaster()
+    notifications = NotificationBus()
 
     def send_sig(sig: str):
         msg_broadcaster.add_signature(sig)
 
-    eth_follower = EthereumFollower("eth", False, send_sig)
-    bse_follower = EthereumFollower("bse", True, send_sig)
-    xch_follower = ChiaFollower("xch", send_sig)
+    eth_follower = EthereumFollower("eth", False, send_sig, notifications)
+    bse_follower = EthereumFollower("bse", True, send_sig, notifications)
+    xch_follower = ChiaFollower("xch", send_sig, notifications)
 
     asyncio.run(xch_follower.wait_for_node(log_startup_connection_errors))
     asyncio.run(eth_follower.wait_for_node(log_startup_connection_errors))
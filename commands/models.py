@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, Boolean
+from sqlalchemy import create_engine, inspect, text, Column, Integer, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.dialects.sqlite import BLOB
@@ -21,6 +21,9 @@ class Message(Base):
     destination = Column(BLOB)
     contents = Column(BLOB)
     block_number = Column(Integer)
+    block_hash = Column(BLOB, nullable=True)
+    # tree hash of the message as signed on chia; filled in the first time it's needed
+    msg_hash = Column(BLOB, nullable=True)
     sig = Column(BLOB)
 
 class ChiaPortalState(Base):
@@ -31,9 +34,41 @@ class ChiaPortalState(Base):
     used_chains_and_nonces = Column(BLOB)
     confirmed_block_height = Column(Integer, nullable=True)
 
+class ScanCursor(Base):
+    __tablename__ = 'scan_cursors'
+    chain_id = Column(BLOB(3), primary_key=True)
+    height = Column(Integer)
+
+# delivery state of a signature on a single nostr relay
+# rows are removed once every relay has received the signature, or when a newer signature for the same route replaces it
+class SignatureOutbox(Base):
+    __tablename__ = 'signature_outbox'
+    sig = Column(BLOB, primary_key=True)
+    relay = Column(BLOB, primary_key=True)
+    delivered = Column(Boolean)
+    attempts = Column(Integer)
+    # first part of the signature (origin chain, destination chain, and nonce)
+    route = Column(BLOB, nullable=True)
+
+# create_all does not alter existing tables, so nullable columns added
+# after a table was first created need to be added manually
+def add_missing_columns(engine):
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = [c['name'] for c in inspector.get_columns(table.name)]
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                ))
+
 def setup_database(db_path='sqlite:///data.db'):
     engine = create_engine(db_path, echo=False)
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
     Session = sessionmaker(bind=engine)
     return Session()
 
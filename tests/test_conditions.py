@@ -0,0 +1,50 @@
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.program import Program
+from chia.types.coin_spend import CoinSpend
+from commands.followers.conditions import ConditionExtractor
+import secrets
+import pytest
+
+# the identity puzzle returns its solution, so the solution is the list of conditions
+IDENTITY_PUZZLE = Program.to(1)
+
+
+def make_identity_spend(conditions: list):
+    coin = Coin(secrets.token_bytes(32), IDENTITY_PUZZLE.get_tree_hash(), 1337)
+    return CoinSpend(coin, IDENTITY_PUZZLE, Program.to(conditions))
+
+
+class TestConditionExtractor:
+    def test_create_coins(self):
+        ph1 = secrets.token_bytes(32)
+        ph2 = secrets.token_bytes(32)
+        spend = make_identity_spend([
+            [51, ph1, 1],
+            [60, b"announcement"],
+            [51, ph2, 1000, [b"xch", b"memo"]],
+        ])
+
+        create_coins = ConditionExtractor().create_coins(spend, 1)
+
+        assert len(create_coins) == 2
+        assert create_coins[0].puzzle_hash == ph1
+        assert create_coins[0].amount == 1
+        assert create_coins[0].memos is None
+        assert create_coins[1].puzzle_hash == ph2
+        assert create_coins[1].amount == 1000
+        assert [m.as_atom() for m in create_coins[1].memos.as_iter()] == [b"xch", b"memo"]
+
+    def test_cache(self):
+        extractor = ConditionExtractor()
+        spend = make_identity_spend([[51, secrets.token_bytes(32), 1]])
+
+        first = extractor.create_coins(spend, 10)
+        assert extractor.create_coins(spend, 10) is first
+        assert extractor.create_coins(spend, 11) is not first
+        assert extractor.create_coins(spend) is not first
+
+    def test_cost_cap(self):
+        spend = make_identity_spend([[51, secrets.token_bytes(32), 1]])
+
+        with pytest.raises(ValueError):
+            ConditionExtractor(max_cost=1).create_coins(spend, 1)
@@ -0,0 +1,160 @@
+from commands.followers.eth_follower import EthereumFollower
+from commands.followers.evm_rpc import AdaptiveBlockWindow
+from commands.config import config
+from commands.models import setup_database
+from web3.exceptions import TransactionNotFound
+from types import SimpleNamespace
+import asyncio
+import pytest
+
+L1_BLOCK_CONTRACT = "0x4200000000000000000000000000000000000015"
+
+
+def make_event(nonce: int, block_number: int, block_hash: bytes) -> dict:
+    return {
+        "args": {"nonce": nonce.to_bytes(32, "big")},
+        "blockNumber": block_number,
+        "blockHash": block_hash,
+    }
+
+
+# L1Block deposit tx; the L1 block number is stored at bytes 28-36 of the calldata
+def make_l1_block_tx(l1_block_number: int, block_hash: bytes) -> SimpleNamespace:
+    return SimpleNamespace(
+        to=L1_BLOCK_CONTRACT,
+        input=b"\x00" * 28 + l1_block_number.to_bytes(8, "big"),
+        blockHash=block_hash,
+    )
+
+
+class FakeEth:
+    def __init__(self, transactions: dict):
+        self.transactions = transactions
+
+    async def get_transaction_by_block(self, block_id, index):
+        if block_id not in self.transactions:
+            raise TransactionNotFound(f"Transaction index: {index} on block id: {block_id} not found.")
+        return self.transactions[block_id]
+
+
+@pytest.fixture
+def follower(monkeypatch):
+    monkeypatch.setitem(config, "base", {
+        "sign_min_height": 3,
+        "portal_address": "0x0000000000000000000000000000000000000001",
+        "my_hot_private_key": "00" * 32,
+        "rpc_url": "http://127.0.0.1:1/",
+        "min_height": 1,
+        "l1_block_contract_address": L1_BLOCK_CONTRACT,
+    })
+    follower = EthereumFollower("base", True, None)
+    # windows are shared per RPC url; tests shouldn't see each other's
+    follower.query_window = AdaptiveBlockWindow(initial_size=follower.max_query_block_limit)
+    monkeypatch.setattr(follower, "getDb", lambda: setup_database("sqlite://"))
+    monkeypatch.setattr(follower, "getPortalContract", lambda web3: None)
+    return follower
+
+
+class TestBackfill:
+    @pytest.mark.asyncio
+    async def test_failing_shard_cancels_the_others(self, follower, monkeypatch):
+        follower.backfill_concurrency = 4
+        started = []
+        cancelled = []
+
+        async def safe_height(web3):
+            return 10000
+        monkeypatch.setattr(follower, "getSafeBackfillHeight", safe_height)
+
+        async def get_events(contract, from_height, to_height):
+            if from_height == 1:
+                await asyncio.sleep(0.01)
+                raise ValueError("connection refused")
+            started.append(from_height)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(from_height)
+                raise
+            return {}
+        monkeypatch.setattr(follower, "getMessageEventsInRange", get_events)
+
+        with pytest.raises(ExceptionGroup):
+            await asyncio.wait_for(follower.backfillMessages(None, None, None, 0, 1), 2)
+
+        # nothing is left running in the background
+        assert len(started) >= 3
+        assert sorted(cancelled) == sorted(started)
+
+    @pytest.mark.asyncio
+    async def test_fast_responses_grow_the_query_window(self, follower, monkeypatch):
+        async def safe_height(web3):
+            return 10000
+        monkeypatch.setattr(follower, "getSafeBackfillHeight", safe_height)
+
+        async def get_events(contract, from_height, to_height):
+            return {}
+        monkeypatch.setattr(follower, "getMessageEventsInRange", get_events)
+
+        assert await follower.backfillMessages(None, None, None, 0, 1) == (0, 1)
+        assert follower.query_window.size == 1000
+
+    @pytest.mark.asyncio
+    async def test_rejected_shards_shrink_the_query_window_once(self, follower, monkeypatch):
+        async def safe_height(web3):
+            return 10000
+        monkeypatch.setattr(follower, "getSafeBackfillHeight", safe_height)
+
+        async def get_events(contract, from_height, to_height):
+            if to_height - from_height + 1 > 250:
+                raise ValueError({"code": -32005, "message": "query returned more than 10000 results"})
+            return {}
+        monkeypatch.setattr(follower, "getMessageEventsInRange", get_events)
+
+        assert await follower.backfillMessages(None, None, None, 0, 1) == (0, 1)
+        # every 500-block shard is rejected, but that only proves the limit is below 500
+        assert 250 <= follower.query_window.size <= 500
+
+
+class TestMessageListener:
+    @pytest.mark.asyncio
+    async def test_reorged_l1_origin_lookup_refetches_event(self, follower, monkeypatch):
+        reorged_hash = b"\x01" * 32
+        canonical_hash = b"\x02" * 32
+        # the first scan sees the message in a block that is reorged out before its L1 origin is looked up
+        scans = [
+            {1: make_event(1, 50, reorged_hash)},
+            {1: make_event(1, 52, canonical_hash)},
+        ]
+        queried_ranges = []
+
+        async def get_events(contract, from_height, to_height):
+            queried_ranges.append((from_height, to_height))
+            return scans[min(len(queried_ranges), len(scans)) - 1]
+        monkeypatch.setattr(follower, "getMessageEventsInRange", get_events)
+
+        web3 = SimpleNamespace(eth=FakeEth({canonical_hash: make_l1_block_tx(1000, canonical_hash)}))
+        monkeypatch.setattr(follower, "getWeb3", lambda: web3)
+
+        async def no_backfill(db, web3, contract, latest_synced_nonce_int, last_synced_height):
+            return latest_synced_nonce_int, last_synced_height
+        monkeypatch.setattr(follower, "backfillMessages", no_backfill)
+
+        real_sleep = asyncio.sleep
+        async def fast_sleep(delay, *args, **kwargs):
+            await real_sleep(0)
+        monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+
+        await follower.height_watcher.publish(100)
+        listener = asyncio.create_task(follower.messageListener())
+        try:
+            pending = await asyncio.wait_for(follower.pending_messages.get(), 2)
+        finally:
+            listener.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await listener
+
+        assert pending.block_number == 52
+        assert pending.confirmation_height == 1000
+        # the stale event was dropped and its block scanned again
+        assert queried_ranges[1][0] <= 50
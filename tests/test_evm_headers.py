@@ -0,0 +1,47 @@
+from commands.followers.evm_headers import BlockHeaderTracker
+from web3.exceptions import BlockNotFound
+import pytest
+
+
+class FakeEth:
+    def __init__(self, hashes: dict):
+        self.hashes = hashes
+
+    async def get_block(self, number):
+        if number not in self.hashes:
+            raise BlockNotFound(f"Block with id: '{number}' not found.")
+        return {"number": number, "hash": self.hashes[number]}
+
+
+class FakeWeb3:
+    def __init__(self, hashes: dict):
+        self.eth = FakeEth(hashes)
+
+
+class TestBlockHeaderTracker:
+    def test_record_detects_reorg(self):
+        tracker = BlockHeaderTracker("test")
+        assert tracker.record(10, b"\x01" * 32)
+        assert tracker.record(11, b"\x02" * 32)
+
+        assert not tracker.record(10, b"\x03" * 32)
+        # everything above the reorged block is forgotten
+        assert 11 not in tracker.hashes
+
+    @pytest.mark.asyncio
+    async def test_is_canonical(self):
+        tracker = BlockHeaderTracker("test")
+        web3 = FakeWeb3({10: b"\x01" * 32})
+
+        assert await tracker.is_canonical(web3, 10, b"\x01" * 32)
+        assert not await tracker.is_canonical(web3, 10, b"\x02" * 32)
+
+    @pytest.mark.asyncio
+    async def test_missing_block_is_not_canonical(self):
+        tracker = BlockHeaderTracker("test")
+        web3 = FakeWeb3({})
+        header_cache = {}
+
+        assert await tracker.fetch_hash(web3, 10) is None
+        assert not await tracker.is_canonical(web3, 10, b"\x01" * 32, header_cache)
+        assert header_cache == {10: None}
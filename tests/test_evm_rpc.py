@@ -0,0 +1,274 @@
+from commands.followers.evm_rpc import BatchingHTTPProvider, PooledRPCProvider, is_range_error
+from aiohttp import web
+import aiohttp
+import pytest_asyncio
+import asyncio
+import pytest
+import json
+
+
+# minimal JSON-RPC endpoint; calls return their first param (if any), eth_fail returns a per-call error
+# reject_batches_containing only rejects batches that include a call to that method
+class StubRPCServer:
+    def __init__(self, reject_batches_with_status: int | None = None, reverse_batches: bool = False, reject_batches_containing: str | None = None):
+        self.reject_batches_with_status = reject_batches_with_status
+        self.reverse_batches = reverse_batches
+        self.reject_batches_containing = reject_batches_containing
+        self.posts = []
+
+    def respond(self, call: dict) -> dict:
+        if call["method"] == "eth_fail":
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32000, "message": "execution reverted"}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": call["params"][0] if len(call["params"]) > 0 else "0x1"}
+
+    def rejects(self, batch: list) -> bool:
+        if self.reject_batches_containing is not None:
+            return any(call["method"] == self.reject_batches_containing for call in batch)
+        return self.reject_batches_with_status is not None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = json.loads(await request.read())
+        self.posts.append(body)
+
+        if isinstance(body, list):
+            if self.rejects(body):
+                return web.Response(status=self.reject_batches_with_status, text="batch requests are not supported")
+            responses = [self.respond(call) for call in body]
+            if self.reverse_batches:
+                responses.reverse()
+            return web.json_response(responses)
+
+        return web.json_response(self.respond(body))
+
+
+async def start_stub(stub: StubRPCServer):
+    app = web.Application()
+    app.router.add_post("/", stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+@pytest_asyncio.fixture(scope="function")
+async def rpc_server(request):
+    stub = StubRPCServer(**getattr(request, "param", {}))
+    runner, url = await start_stub(stub)
+    yield stub, url
+    await runner.cleanup()
+
+
+class FakeProvider:
+    def __init__(self, endpoint_uri: str, delay: float = 0, error: Exception | None = None):
+        self.endpoint_uri = endpoint_uri
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def make_request(self, method, params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"jsonrpc": "2.0", "id": 1, "result": self.endpoint_uri}
+
+
+def http_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+class TestIsRangeError:
+    @pytest.mark.parametrize("message", [
+        "query returned more than 10000 results",
+        "eth_getLogs is limited to a 10,000 range",
+        "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range",
+        "block range is too wide",
+        "query timeout exceeded",
+        "too many results, narrow the filter",
+    ])
+    def test_range_messages(self, message):
+        assert is_range_error(ValueError({"code": -32005, "message": message}))
+
+    @pytest.mark.parametrize("message", [
+        "rate limit exceeded",
+        "Too Many Requests",
+        "daily request limit reached",
+        "you have exceeded your capacity, upgrade your plan",
+        "monthly quota exceeded",
+        "execution reverted",
+        "connection refused",
+    ])
+    def test_other_messages(self, message):
+        assert not is_range_error(ValueError({"code": -32005, "message": message}))
+
+    def test_http_status(self):
+        assert is_range_error(http_error(400))
+        assert is_range_error(http_error(413))
+        assert not is_range_error(http_error(429))
+        assert not is_range_error(http_error(503))
+
+    def test_timeout(self):
+        assert is_range_error(asyncio.TimeoutError())
+
+
+class TestBatchingHTTPProvider:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("rpc_server", [{"reverse_batches": True}], indirect=True)
+    async def test_batch_matches_responses_by_id(self, rpc_server):
+        stub, url = rpc_server
+        provider = BatchingHTTPProvider(url)
+
+        responses = await asyncio.gather(*[provider.make_request("eth_chainId", [i]) for i in range(5)])
+
+        assert [r["result"] for r in responses] == list(range(5))
+        assert len(stub.posts) == 1 and len(stub.posts[0]) == 5
+
+    @pytest.mark.asyncio
+    async def test_per_call_errors(self, rpc_server):
+        stub, url = rpc_server
+        provider = BatchingHTTPProvider(url)
+
+        responses = await asyncio.gather(
+            provider.make_request("eth_chainId", [1]),
+            provider.make_request("eth_fail", [2]),
+            provider.make_request("eth_chainId", [3]),
+        )
+
+        assert responses[0]["result"] == 1
+        assert responses[1]["error"]["message"] == "execution reverted"
+        assert responses[2]["result"] == 3
+        assert provider.batching_supported
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("rpc_server", [{"reject_batches_with_status": 400}], indirect=True)
+    async def test_http_error_falls_back_to_single_requests(self, rpc_server):
+        stub, url = rpc_server
+        provider = BatchingHTTPProvider(url)
+
+        responses = await asyncio.gather(*[provider.make_request("eth_chainId", [i]) for i in range(3)])
+
+        assert [r["result"] for r in responses] == [0, 1, 2]
+        assert not provider.batching_supported
+        # one rejected batch, one rejected probe, then one request per call
+        assert len(stub.posts) == 5
+
+        response = await provider.make_request("eth_chainId", [7])
+        assert response["result"] == 7
+        assert not isinstance(stub.posts[-1], list)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("rpc_server", [{"reject_batches_with_status": 413, "reject_batches_containing": "eth_getLogs"}], indirect=True)
+    async def test_rejected_call_does_not_disable_batching(self, rpc_server):
+        stub, url = rpc_server
+        provider = BatchingHTTPProvider(url)
+
+        responses = await asyncio.gather(
+            provider.make_request("eth_getLogs", ["logs"]),
+            provider.make_request("eth_chainId", [1]),
+        )
+
+        assert [r["result"] for r in responses] == ["logs", 1]
+        # the probe batch went through, so only the calls of the rejected batch are sent individually
+        assert provider.batching_supported
+
+        await asyncio.gather(*[provider.make_request("eth_chainId", [i]) for i in range(3)])
+        assert len(stub.posts[-1]) == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("rpc_server", [{"reject_batches_with_status": 503}], indirect=True)
+    async def test_server_error_retries_calls_individually(self, rpc_server):
+        stub, url = rpc_server
+        provider = BatchingHTTPProvider(url)
+
+        responses = await asyncio.gather(*[provider.make_request("eth_chainId", [i]) for i in range(3)])
+
+        assert [r["result"] for r in responses] == [0, 1, 2]
+        # a server error says nothing about batch support
+        assert provider.batching_supported
+
+
+class TestPooledRPCProvider:
+    @pytest.mark.asyncio
+    async def test_failover(self):
+        broken = FakeProvider("broken", error=ValueError("connection refused"))
+        working = FakeProvider("working")
+        pool = PooledRPCProvider([broken, working], hedge=False)
+        pool.exploration_rate = 0
+
+        response = await pool.make_request("eth_chainId", [])
+        assert response["result"] == "working"
+
+        # the broken endpoint is in cooldown, so the next request goes straight to the working one
+        assert pool.endpoints[0].in_cooldown()
+        response = await pool.make_request("eth_chainId", [])
+        assert response["result"] == "working"
+        assert broken.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_range_errors_are_not_endpoint_failures(self):
+        first = FakeProvider("first", error=ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+        second = FakeProvider("second")
+        pool = PooledRPCProvider([first, second], hedge=False)
+        pool.exploration_rate = 0
+
+        with pytest.raises(ValueError):
+            await pool.make_request("eth_getLogs", [])
+
+        # no failover and no cooldown - the caller shrinks the range instead
+        assert second.calls == 0
+        assert not pool.endpoints[0].in_cooldown()
+        assert pool.endpoints[0].consecutive_errors == 0
+
+        # the same message for any other method is an ordinary failure
+        response = await pool.make_request("eth_chainId", [])
+        assert response["result"] == "second"
+        assert pool.endpoints[0].in_cooldown()
+
+    @pytest.mark.asyncio
+    async def test_all_endpoints_failing(self):
+        pool = PooledRPCProvider([
+            FakeProvider("a", error=ValueError("a failed")),
+            FakeProvider("b", error=ValueError("b failed")),
+        ])
+
+        with pytest.raises(ValueError):
+            await pool.make_request("eth_chainId", [])
+
+    @pytest.mark.asyncio
+    async def test_hedging(self):
+        slow = FakeProvider("slow", delay=5)
+        fast = FakeProvider("fast")
+        pool = PooledRPCProvider([slow, fast])
+        pool.exploration_rate = 0
+        # slow is ranked first; its p95 latency is 10ms
+        for _ in range(20):
+            pool.endpoints[0].record_success(0.01)
+        pool.endpoints[1].record_success(1)
+
+        response = await asyncio.wait_for(pool.make_request("eth_chainId", []), 1)
+
+        assert response["result"] == "fast"
+        await asyncio.sleep(0)
+        assert slow.cancelled == 1
+
+    @pytest.mark.asyncio
+    async def test_no_hedging_for_transactions(self):
+        slow = FakeProvider("slow", delay=0.2)
+        fast = FakeProvider("fast")
+        pool = PooledRPCProvider([slow, fast])
+        pool.exploration_rate = 0
+        for _ in range(20):
+            pool.endpoints[0].record_success(0.01)
+        pool.endpoints[1].record_success(1)
+
+        response = await pool.make_request("eth_sendRawTransaction", [])
+
+        assert response["result"] == "slow"
+        assert fast.calls == 0
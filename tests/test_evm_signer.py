@@ -0,0 +1,61 @@
+from commands.models import Message, join_message_contents, split_message_contents
+from commands.followers.evm_signer import PortalMessageSigner
+from eth_account.messages import encode_typed_data
+from eth_account import Account
+from web3 import Web3
+import secrets
+import pytest
+
+CHAIN_ID = 8453
+PORTAL_ADDRESS = Web3.to_checksum_address("0x" + secrets.token_bytes(20).hex())
+
+
+def reference_signature(private_key: str, message: Message) -> bytes:
+    destination = message.destination.hex()[-40:]
+    destination = "0" * (40 - len(destination)) + destination
+    encoded_data = encode_typed_data(
+        {
+            'name': 'warp.green Portal',
+            'version': '1',
+            'chainId': CHAIN_ID,
+            'verifyingContract': PORTAL_ADDRESS,
+        },
+        {
+            'Message': [
+                {'name': 'nonce', 'type': 'bytes32'},
+                {'name': 'source_chain', 'type': 'bytes3'},
+                {'name': 'source', 'type': 'bytes32'},
+                {'name': 'destination', 'type': 'address'},
+                {'name': 'contents', 'type': 'bytes32[]'},
+            ]
+        },
+        {
+            'nonce': '0x' + message.nonce.hex(),
+            'source_chain': '0x' + message.source_chain.hex(),
+            'source': '0x' + message.source.hex(),
+            'destination': Web3.to_checksum_address("0x" + destination),
+            'contents': ['0x' + content.hex() for content in split_message_contents(message.contents)],
+        }
+    )
+    signed_message = Account.sign_message(encoded_data, private_key=private_key)
+    return bytes([signed_message.v]) + signed_message.r.to_bytes(32, "big") + signed_message.s.to_bytes(32, "big")
+
+
+class TestEvmSigner:
+    @pytest.mark.parametrize("destination_length", [20, 32])
+    @pytest.mark.parametrize("contents_count", [0, 1, 3])
+    def test_matches_encode_typed_data(self, destination_length, contents_count):
+        private_key = "0x" + secrets.token_bytes(32).hex()
+        message = Message(
+            nonce=secrets.token_bytes(32),
+            source_chain=b"xch",
+            source=secrets.token_bytes(32),
+            destination_chain=b"bse",
+            destination=secrets.token_bytes(destination_length),
+            contents=join_message_contents([secrets.token_bytes(32) for _ in range(contents_count)]),
+            sig=b'',
+        )
+
+        signer = PortalMessageSigner(private_key, CHAIN_ID, PORTAL_ADDRESS)
+        assert signer.sign(message) == reference_signature(private_key, message)
+        assert signer.sign_many([message, message]) == [signer.sign(message)] * 2
@@ -0,0 +1,292 @@
+from commands.config import config
+from commands.models import setup_database, SignatureOutbox
+from commands.followers.sig import MessageBroadcaster, SignatureLog, RelayHealth
+from commands.followers.sig_codec import encode_signature
+import secrets
+import asyncio
+import pytest
+
+MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+RELAYS = ["wss://relay-a", "wss://relay-b", "wss://relay-c"]
+
+
+# stands in for nostr_sdk.Client; like nostr-sdk 0.32, a send returns the event id and rejections raise
+class FakeClient:
+    def __init__(self, failing_relays: list = [], delays: dict = {}, failures_before_success: dict = {}):
+        self.failing_relays = set(failing_relays)
+        self.delays = delays
+        self.failures_before_success = dict(failures_before_success)
+        self.started = []
+        self.sent = []
+
+    async def send_event_to(self, urls: list, event):
+        assert len(urls) == 1
+        relay = urls[0]
+        self.started.append((relay, event.id().to_hex()))
+        await asyncio.sleep(self.delays.get(relay, 0))
+        if relay in self.failing_relays:
+            raise Exception(f"event not published: {relay} rejected it")
+        if self.failures_before_success.get(relay, 0) > 0:
+            self.failures_before_success[relay] -= 1
+            raise Exception(f"event not published: {relay} is not connected")
+
+        self.sent.append((relay, event.id().to_hex()))
+        return event.id()
+
+
+def make_signature(coin_id: bytes | None = None, nonce: bytes | None = None) -> str:
+    return encode_signature(
+        b"eth",
+        b"xch",
+        nonce if nonce is not None else secrets.token_bytes(32),
+        coin_id if coin_id is not None else secrets.token_bytes(32),
+        secrets.token_bytes(96)
+    )
+
+
+@pytest.fixture
+def broadcaster(monkeypatch, tmp_path) -> MessageBroadcaster:
+    monkeypatch.setitem(config, "nostr", {"relays": RELAYS, "my_mnemonic": MNEMONIC})
+
+    broadcaster = MessageBroadcaster()
+    broadcaster.db = setup_database("sqlite://")
+    broadcaster.log = SignatureLog(str(tmp_path / "messages.txt"))
+    broadcaster.retry_base_delay = 0.01
+    return broadcaster
+
+
+def start_senders(broadcaster: MessageBroadcaster, client: FakeClient, workers: int = 4, fill_in_workers: int = 2) -> list:
+    async def get_client():
+        return client
+    broadcaster.getClient = get_client
+
+    return [asyncio.ensure_future(broadcaster.sender(broadcaster.message_queue)) for _ in range(workers)] + \
+        [asyncio.ensure_future(broadcaster.sender(broadcaster.fill_in_queue)) for _ in range(fill_in_workers)]
+
+
+async def run_senders(broadcaster: MessageBroadcaster, client: FakeClient, workers: int = 4, fill_in_workers: int = 2):
+    tasks = start_senders(broadcaster, client, workers, fill_in_workers)
+    try:
+        # retries are put back on the queues by the loop, so wait until none are scheduled either
+        while True:
+            await asyncio.wait_for(broadcaster.message_queue.join(), 5)
+            await asyncio.wait_for(broadcaster.fill_in_queue.join(), 5)
+            if broadcaster.retries_scheduled == 0 and broadcaster.message_queue.empty():
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class TestRelayHealth:
+    def test_latency_percentiles(self):
+        health = RelayHealth("wss://relay-a")
+        assert health.latency_percentile(0.5) is None
+
+        for seconds in [0.01, 0.02, 0.03, 0.2, 3]:
+            health.record_success(seconds)
+
+        assert health.successes == 5
+        assert health.latency_percentile(0.5) == 0.05
+        assert health.latency_percentile(0.9) == 5
+        assert health.success_rate == 1
+        assert "p50 <= 0.05s" in health.summary()
+
+    def test_failures(self):
+        health = RelayHealth("wss://relay-a")
+        health.record_success(0.1)
+
+        for _ in range(4):
+            health.record_failure("timeout")
+        assert health.is_healthy()
+        assert health.success_rate < 1
+
+        health.record_failure("timeout")
+        assert not health.is_healthy()
+        assert health.last_error == "timeout"
+        assert health.summary().endswith("(demoted)")
+
+        health.record_success(0.1)
+        assert health.is_healthy()
+        assert health.consecutive_failures == 0
+
+    def test_score(self):
+        fast = RelayHealth("wss://fast")
+        slow = RelayHealth("wss://slow")
+        unmeasured = RelayHealth("wss://unmeasured")
+        demoted = RelayHealth("wss://demoted")
+        for _ in range(10):
+            fast.record_success(0.04)
+            slow.record_success(1.5)
+            demoted.record_success(0.01)
+        for _ in range(5):
+            demoted.record_failure("rejected")
+
+        ranked = sorted([demoted, slow, fast, unmeasured], key=lambda health: health.score())
+        assert [health.url for health in ranked] == ["wss://unmeasured", "wss://fast", "wss://slow", "wss://demoted"]
+
+
+class TestMessageBroadcaster:
+    @pytest.mark.asyncio
+    async def test_send_signature(self, broadcaster: MessageBroadcaster):
+        client = FakeClient(failing_relays=["wss://relay-c"])
+        broadcaster.client = client
+        broadcaster.client_lock = asyncio.Lock()
+
+        delivered = await broadcaster.send_signature(make_signature(), RELAYS)
+
+        assert delivered == ["wss://relay-a", "wss://relay-b"]
+        # the event is signed once, so every relay gets the same one
+        assert len(set([event_id for _, event_id in client.sent])) == 1
+
+        assert broadcaster.relay_health["wss://relay-a"].successes == 1
+        assert sum(broadcaster.relay_health["wss://relay-a"].latency_histogram) == 1
+        assert broadcaster.relay_health["wss://relay-c"].failures == 1
+        assert broadcaster.relay_health["wss://relay-c"].last_error.startswith("event not published")
+
+    @pytest.mark.asyncio
+    async def test_signature_published_once(self, broadcaster: MessageBroadcaster):
+        client = FakeClient()
+
+        broadcaster.add_signature(make_signature())
+        await run_senders(broadcaster, client)
+
+        assert sorted([relay for relay, _ in client.sent]) == RELAYS
+        assert len(set([event_id for _, event_id in client.sent])) == 1
+        assert broadcaster.sent_count == 1
+        assert broadcaster.retry_count == 0
+        assert broadcaster.db.query(SignatureOutbox).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_sends_same_event(self, broadcaster: MessageBroadcaster):
+        client = FakeClient(failures_before_success={"wss://relay-c": 2})
+
+        broadcaster.add_signature(make_signature())
+        await run_senders(broadcaster, client)
+
+        assert sorted([relay for relay, _ in client.sent]) == RELAYS
+        assert len(set([event_id for _, event_id in client.sent])) == 1
+        assert broadcaster.retry_count == 2
+        assert broadcaster.relay_health["wss://relay-c"].successes == 1
+        assert broadcaster.relay_health["wss://relay-c"].consecutive_failures == 0
+        assert broadcaster.db.query(SignatureOutbox).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_resume_outbox(self, broadcaster: MessageBroadcaster):
+        partly_delivered = make_signature()
+        never_delivered = make_signature()
+        out_of_attempts = make_signature()
+
+        def add_rows(sig: str, delivered: list, attempts: list):
+            broadcaster.db.add_all([
+                SignatureOutbox(sig=sig.encode(), relay=relay.encode(), delivered=d, attempts=a, route=sig.split("-")[0].encode())
+                for relay, d, a in zip(RELAYS, delivered, attempts)
+            ])
+        add_rows(partly_delivered, [True, False, False], [1, 1, broadcaster.max_attempts])
+        add_rows(never_delivered, [False, False, False], [broadcaster.max_attempts] * 3)
+        add_rows(out_of_attempts, [False, False, False], [2 * broadcaster.max_attempts] * 3)
+        broadcaster.db.commit()
+
+        broadcaster.resumeOutbox()
+
+        resumed = {}
+        while not broadcaster.message_queue.empty():
+            item = broadcaster.message_queue.get_nowait()
+            resumed[item.sig] = item.relays
+        assert resumed == {
+            partly_delivered: ["wss://relay-b"],
+            never_delivered: RELAYS,
+        }
+        assert broadcaster.db.query(SignatureOutbox).filter(
+            SignatureOutbox.sig == out_of_attempts.encode()
+        ).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_newer_signature_supersedes_outbox(self, broadcaster: MessageBroadcaster):
+        nonce = secrets.token_bytes(32)
+        old_sig = make_signature(nonce=nonce)
+        new_sig = make_signature(nonce=nonce)
+        other_sig = make_signature()
+
+        broadcaster.add_signature(old_sig)
+        broadcaster.add_signature(other_sig)
+        broadcaster.add_signature(new_sig)
+
+        assert set([row.sig.decode() for row in broadcaster.db.query(SignatureOutbox).all()]) == set([new_sig, other_sig])
+
+        client = FakeClient()
+        await run_senders(broadcaster, client)
+
+        # the old signature was still queued, but is not published
+        sent_event_ids = set([event_id for _, event_id in client.sent])
+        assert sent_event_ids == set([broadcaster.getEvent(sig).id().to_hex() for sig in [new_sig, other_sig]])
+        assert broadcaster.db.query(SignatureOutbox).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_undelivered_signature_kept_for_restart(self, broadcaster: MessageBroadcaster):
+        sig = make_signature()
+        client = FakeClient(failing_relays=RELAYS)
+
+        broadcaster.add_signature(sig)
+        await run_senders(broadcaster, client)
+
+        assert broadcaster.failed_count == 1
+        rows = broadcaster.db.query(SignatureOutbox).all()
+        assert len(rows) == 3
+        assert all(not row.delivered and row.attempts == broadcaster.max_attempts for row in rows)
+
+        # one more round after a restart, then the signature is given up on
+        broadcaster.resumeOutbox()
+        await run_senders(broadcaster, client)
+        broadcaster.resumeOutbox()
+        assert broadcaster.message_queue.empty()
+        assert broadcaster.db.query(SignatureOutbox).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_quorum_then_fill_in(self, broadcaster: MessageBroadcaster):
+        for _ in range(10):
+            broadcaster.relay_health["wss://relay-a"].record_success(2)
+            broadcaster.relay_health["wss://relay-b"].record_success(0.01)
+            broadcaster.relay_health["wss://relay-c"].record_success(0.2)
+        assert broadcaster.rankRelays(RELAYS) == ["wss://relay-b", "wss://relay-c", "wss://relay-a"]
+
+        client = FakeClient()
+        broadcaster.add_signature(make_signature())
+        await run_senders(broadcaster, client)
+
+        # the slowest relay is only sent to after the quorum publish is done
+        assert [relay for relay, _ in client.started] == ["wss://relay-b", "wss://relay-c", "wss://relay-a"]
+        assert [relay for relay, _ in client.sent][-1] == "wss://relay-a"
+        assert broadcaster.sent_count == 1
+        assert broadcaster.db.query(SignatureOutbox).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_fill_in_does_not_delay_quorum(self, broadcaster: MessageBroadcaster):
+        for _ in range(10):
+            broadcaster.relay_health["wss://relay-a"].record_success(2)
+            broadcaster.relay_health["wss://relay-b"].record_success(0.01)
+            broadcaster.relay_health["wss://relay-c"].record_success(0.01)
+
+        client = FakeClient(delays={"wss://relay-a": 0.5})
+        first_sig = make_signature()
+        second_sig = make_signature()
+        tasks = start_senders(broadcaster, client, workers=1, fill_in_workers=1)
+        try:
+            broadcaster.add_signature(first_sig)
+            await asyncio.wait_for(broadcaster.message_queue.join(), 1)
+            await asyncio.sleep(0.05)
+            # the first signature's fill-in to the slow relay is in progress
+            assert client.started[-1] == ("wss://relay-a", broadcaster.getEvent(first_sig).id().to_hex())
+
+            broadcaster.add_signature(second_sig)
+            await asyncio.wait_for(broadcaster.message_queue.join(), 0.25)
+            second_event_id = broadcaster.getEvent(second_sig).id().to_hex()
+            assert sorted([relay for relay, event_id in client.sent if event_id == second_event_id]) == ["wss://relay-b", "wss://relay-c"]
+            assert "wss://relay-a" not in [relay for relay, _ in client.sent]
+
+            await asyncio.wait_for(broadcaster.fill_in_queue.join(), 2)
+            assert len(client.sent) == 6
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,58 @@
+from chia.util.bech32m import bech32_encode, convertbits, bech32_decode
+from commands.followers.sig_codec import encode_signature, decode_signature, decode_many, \
+    bech32m_encode, bech32m_decode
+import secrets
+import pytest
+
+
+# previous implementation; the wire format must not change
+def reference_encode_signature(origin_chain: bytes, destination_chain: bytes, nonce: bytes, coin_id: bytes | None, sig: bytes) -> str:
+    res = bech32_encode("r", convertbits(origin_chain + destination_chain + nonce, 8, 5)) + "-"
+    if coin_id is not None:
+        res += bech32_encode("c", convertbits(coin_id, 8, 5))
+    return res + "-" + bech32_encode("s", convertbits(sig, 8, 5))
+
+
+def random_signature(with_coin_id: bool):
+    return (
+        b"eth",
+        b"xch",
+        secrets.token_bytes(32),
+        secrets.token_bytes(32) if with_coin_id else None,
+        secrets.token_bytes(96)
+    )
+
+
+class TestSigCodec:
+    @pytest.mark.parametrize("length", [0, 1, 3, 5, 32, 38, 96])
+    def test_bech32m_matches_reference(self, length: int):
+        for hrp in ["r", "c", "s"]:
+            data = secrets.token_bytes(length)
+            encoded = bech32m_encode(hrp, data)
+
+            assert encoded == bech32_encode(hrp, convertbits(data, 8, 5))
+            assert bech32m_decode(encoded, 200) == (hrp, data)
+            assert bytes(convertbits(bech32_decode(encoded, 200)[1], 5, 8, False)) == data
+
+    @pytest.mark.parametrize("with_coin_id", [True, False])
+    def test_signature_round_trip(self, with_coin_id: bool):
+        sig = random_signature(with_coin_id)
+        encoded = encode_signature(*sig)
+
+        assert encoded == reference_encode_signature(*sig)
+        assert decode_signature(encoded) == sig
+
+    def test_decode_many(self):
+        sigs = [random_signature(i % 2 == 0) for i in range(10)]
+        encoded = [encode_signature(*sig) for sig in sigs]
+
+        # flip one checksum character
+        last = encoded[3][-1]
+        encoded[3] = encoded[3][:-1] + ("q" if last != "q" else "p")
+
+        decoded = decode_many(encoded + ["", "not-a-signature"])
+
+        assert decoded[:3] == sigs[:3]
+        assert decoded[3] is None
+        assert decoded[4:10] == sigs[4:]
+        assert decoded[10:] == [None, None]
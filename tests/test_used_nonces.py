@@ -0,0 +1,94 @@
+from chia.types.blockchain_format.program import Program
+from commands.followers.used_nonces import UsedNonces
+import random
+import pytest
+
+
+# previous list-based implementation; UsedNonces must produce the exact same bytes
+def reference_add_chain_and_nonce(base_data: Program, source_chain: bytes, nonce: int) -> Program:
+    chain_data_parts = []
+    found = False
+
+    for chain_data in base_data.as_iter():
+        if chain_data.first() != source_chain:
+            chain_data_parts.append(chain_data)
+            continue
+
+        found = True
+        chain_data_ints = [_.as_int() for _ in chain_data.rest().as_iter()]
+
+        assert chain_data_ints[0] < nonce and nonce not in chain_data_ints
+        chain_data_ints.append(nonce)
+        chain_data_ints.sort()
+
+        while len(chain_data_ints) > 1 and chain_data_ints[0] + 1 == chain_data_ints[1]:
+            chain_data_ints[0] += 1
+            chain_data_ints.pop(1)
+
+        chain_data_parts.append(Program.to([source_chain] + chain_data_ints))
+
+    if not found:
+        if nonce == 1:
+            chain_data_parts.append(Program.to([source_chain, nonce]))
+        else:
+            chain_data_parts.append(Program.to([source_chain, 0, nonce]))
+
+    return Program.to(chain_data_parts)
+
+
+class TestUsedNonces:
+    def test_empty(self):
+        used = UsedNonces.from_bytes(bytes(Program.to([])))
+
+        assert not used.is_used(b'eth', 1)
+        assert bytes(used) == bytes(Program.to([]))
+
+    def test_prefix_and_sparse(self):
+        used = UsedNonces.from_program(Program.to([[b'eth', 3, 5, 7]]))
+
+        for nonce in [1, 2, 3, 5, 7]:
+            assert used.is_used(b'eth', nonce)
+        for nonce in [4, 6, 8]:
+            assert not used.is_used(b'eth', nonce)
+        assert not used.is_used(b'bse', 1)
+
+        used.add(b'eth', 4)
+        assert bytes(used) == bytes(Program.to([[b'eth', 5, 7]]))
+
+    def test_bytes_nonce(self):
+        used = UsedNonces()
+        used.add(b'eth', (2).to_bytes(32, "big"))
+
+        assert used.is_used(b'eth', (2).to_bytes(32, "big"))
+        assert not used.is_used(b'eth', (1).to_bytes(32, "big"))
+
+    def test_double_add_fails(self):
+        used = UsedNonces()
+        used.add(b'eth', 1)
+
+        with pytest.raises(AssertionError):
+            used.add(b'eth', 1)
+
+    @pytest.mark.parametrize("seed", [0, 1, 2, 3])
+    def test_matches_reference(self, seed: int):
+        rng = random.Random(seed)
+        chains = [b'eth', b'bse', b'xch']
+        remaining = {chain: list(range(1, 60)) for chain in chains}
+        for nonces in remaining.values():
+            rng.shuffle(nonces)
+            # keep nonces roughly in order, like real portal spends
+            nonces.sort(key=lambda n: n + rng.randint(0, 8))
+
+        reference = Program.to([])
+        used = UsedNonces.from_program(reference)
+        while any(len(nonces) > 0 for nonces in remaining.values()):
+            chain = rng.choice([c for c in chains if len(remaining[c]) > 0])
+            nonce = remaining[chain].pop(0)
+
+            reference = reference_add_chain_and_nonce(reference, chain, nonce)
+            used.add(chain, nonce)
+
+            assert bytes(used) == bytes(reference)
+            assert used.is_used(chain, nonce)
+
+        assert bytes(UsedNonces.from_bytes(bytes(reference))) == bytes(reference)